@@ -1,23 +1,67 @@
 # -*- coding: utf-8 -*-
 import os
+import re
+import json
+import time
+import queue
+import hashlib
 import threading
+import importlib.util
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-from huggingface_hub import HfApi, snapshot_download, login as hf_login
+from huggingface_hub import HfApi, snapshot_download, hf_hub_download, login as hf_login
+from huggingface_hub import constants as hf_constants
+
+# 可选：hf_transfer（Rust 多连接分片下载），未安装时自动回退到默认下载
+HAS_HF_TRANSFER = importlib.util.find_spec("hf_transfer") is not None
+
+# apply_env 管理的环境变量
+MANAGED_ENV_KEYS = ("HF_ENDPOINT", "HF_HUB_DISABLE_HTTP2", "HF_HUB_ENABLE_HF_TRANSFER", "HF_XET_HIGH_PERFORMANCE")
+
+# 可选：为 huggingface_hub 配置连接池更大、带重试的 requests.Session（新版 hub 改用 httpx，无此接口时跳过）
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    from huggingface_hub import configure_http_backend
+except ImportError:
+    configure_http_backend = None
 
 # -------------------- 默认配置（可在 GUI 中修改） --------------------
 DEFAULT_REPO_ID = "ibrahimhamamci/CT-RATE"
 DEFAULT_REVISION = "daddf2f4ff5cfbcebc70756462bb9518d5585246"
 DEFAULT_REMOTE_DIR = "dataset/train"
+CACHE_DIR = Path.home() / ".cache" / "ct_rate_dl"  # 子目录列表的本地缓存
+LOG_MAX_LINES = 2000  # 日志框最多保留的行数
+DONE_SENTINEL = ".ct_rate_done"  # 子目录下载完成标记（隐藏文件，不影响 _dir_has_any_file 判断）
+FILES_PER_DIR = 4  # 每个子目录并发下载的文件数；逐文件池大小 = 并发子目录数 × 该值
+
+# -------------------- 工具函数：HTTP 会话（复用 TCP/TLS 连接） --------------------
+def make_http_session():
+    """hub 按线程缓存 Session；这里放大连接池并对 5xx 自动退避重试"""
+    s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504]),
+    )
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
 
 # -------------------- 工具函数：列出一级子目录（兼容不同 hub 版本） --------------------
 def list_first_level_dirs(api: HfApi, repo_id: str, revision: str, base: str):
     """
     返回 base/ 下的一级子目录绝对路径列表（形如 dataset/train/train_1）
-    先尝试 list_repo_tree(path_in_repo=...)；不支持时回退到 list_repo_files 聚合。
+    先尝试 list_repo_tree(path_in_repo=...)；不支持时回退到 base 下的递归 tree，最后才用 list_repo_files 聚合。
     """
+    base = base.strip("/")
+    prefix = base + "/"
+
     # 新 API：list_repo_tree + path_in_repo
     try:
         tree = api.list_repo_tree(
@@ -27,7 +71,12 @@ def list_first_level_dirs(api: HfApi, repo_id: str, revision: str, base: str):
             recursive=False,
             path_in_repo=base,
         )
-        dirs = sorted(e.path for e in tree if getattr(e, "type", "") == "directory")
+        dirs = []
+        append = dirs.append
+        for e in tree:  # 逐条消费，文件条目不留存
+            if getattr(e, "type", "") == "directory":
+                append(e.path)
+        dirs.sort()
         if dirs:
             return dirs
     except TypeError:
@@ -35,17 +84,90 @@ def list_first_level_dirs(api: HfApi, repo_id: str, revision: str, base: str):
     except Exception:
         pass
 
-    # 回退：list_repo_files 全量，再聚合出第一层目录
+    # 回退 1：只递归 base 之下（而非整个仓库），流式聚合第一层目录
+    try:
+        tree = api.list_repo_tree(
+            repo_id=repo_id,
+            repo_type="dataset",
+            revision=revision,
+            recursive=True,
+            path_in_repo=base,
+        )
+        seen = {}
+        for e in tree:
+            rest = e.path[len(prefix):] if e.path.startswith(prefix) else ""
+            if "/" in rest or (rest and getattr(e, "type", "") == "directory"):
+                seen.setdefault(rest.split("/", 1)[0], None)
+        if seen:
+            return sorted(f"{base}/{d}" for d in seen)
+    except Exception:
+        pass
+
+    # 回退 2：list_repo_files 全量，再聚合出第一层目录
     files = api.list_repo_files(repo_id=repo_id, repo_type="dataset", revision=revision)
-    prefix = base.rstrip("/") + "/"
+    pat = re.compile(rf"^{re.escape(prefix)}([^/]+)/")
     subdir_set = set()
+    last = None  # 文件列表通常按路径有序：同一子目录的后续文件只需一次 startswith 即可跳过
     for f in files:
-        if f.startswith(prefix):
-            rest = f[len(prefix):]
-            if "/" in rest:
-                subdir = rest.split("/", 1)[0]
-                subdir_set.add(f"{base}/{subdir}")
-    return sorted(subdir_set)
+        if last is not None and f.startswith(last):
+            continue
+        m = pat.match(f)
+        if m:
+            subdir_set.add(m.group(1))
+            last = m.group(0)
+    return sorted(f"{base}/{d}" for d in subdir_set)
+
+# -------------------- 带本地缓存与重试的子目录列表 --------------------
+def cached_list_dirs(api: HfApi, repo_id: str, revision: str, base: str, refresh: bool = False):
+    """
+    以 (repo_id, revision, base) 为键缓存 list_first_level_dirs 的结果到 CACHE_DIR/<hash>.json
+    返回 (dirs, from_cache)；refresh=True 时忽略缓存重新请求，请求失败最多重试 3 次
+    """
+    key = hashlib.blake2b(f"{repo_id}\n{revision}\n{base}".encode("utf-8"), digest_size=16).hexdigest()
+    cache_file = CACHE_DIR / f"{key}.json"
+    if not refresh:
+        try:
+            return json.loads(cache_file.read_text(encoding="utf-8")), True
+        except (OSError, ValueError):
+            pass
+
+    for attempt in range(3):
+        try:
+            dirs = list_first_level_dirs(api, repo_id, revision, base)
+            break
+        except Exception:
+            if attempt == 2:
+                raise
+            time.sleep(2 ** attempt)
+
+    if dirs:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = cache_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(dirs), encoding="utf-8")
+            os.replace(tmp, cache_file)  # 先写临时文件再替换，避免半截缓存
+        except OSError:
+            pass
+    return dirs, False
+
+# -------------------- 子目录完成标记 --------------------
+def is_dir_done(local_dir: Path, revision: str) -> bool:
+    """local_dir 下存在同一 revision 写入的完成标记"""
+    try:
+        info = json.loads((local_dir / DONE_SENTINEL).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return isinstance(info, dict) and info.get("revision") == revision
+
+def mark_dir_done(local_dir: Path, revision: str):
+    """统计 local_dir 内的文件数并原子写入完成标记"""
+    n = 0
+    for root, dirs, files in os.walk(local_dir):
+        dirs[:] = [x for x in dirs if not x.startswith(".")]
+        n += sum(1 for x in files if not x.startswith("."))
+    tmp = local_dir / (DONE_SENTINEL + ".tmp")
+    tmp.write_text(json.dumps({"files": n, "revision": revision}), encoding="utf-8")
+    os.replace(tmp, local_dir / DONE_SENTINEL)
 
 # -------------------- GUI 应用 --------------------
 class App(tk.Tk):
@@ -56,9 +178,24 @@ class App(tk.Tk):
 
         self._build_ui()
 
+        if configure_http_backend is not None:
+            configure_http_backend(backend_factory=make_http_session)
+
         # 内部状态
         self.subdirs = []  # 列出的子目录
         self.downloading = False
+        self._listing = False  # 正在后台列出子目录
+        self._api_cache = {}  # (endpoint, token 摘要) -> HfApi
+        self._login_token_hash = None  # 上次成功 hf_login 的 token 摘要，未变则不再重复登录
+        self._current_env = {k: os.environ.get(k) for k in MANAGED_ENV_KEYS}  # 启动时读一次，之后只按差异写入
+        self._repo_tree_cache = {}  # (repo, revision, 子目录) -> 文件列表，按需填充
+        self._pools = []  # 本次下载中的线程池，关闭窗口时取消其中排队的任务
+        self._closing = False
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # 工作线程只往队列里放 ("log", 文本) / ("step", n) / ("reset", maximum)，由主线程定时统一刷新界面
+        self._ui_queue = queue.Queue()
+        self.after(100, self._drain_ui_queue)
 
     # UI 结构
     def _build_ui(self):
@@ -97,8 +234,10 @@ class App(tk.Tk):
 
         self.use_mirror = tk.BooleanVar(value=True)
         self.disable_h2 = tk.BooleanVar(value=True)
+        self.use_hf_transfer = tk.BooleanVar(value=HAS_HF_TRANSFER)
         ttk.Checkbutton(frm_top, text="使用镜像（hf-mirror.com）", variable=self.use_mirror).grid(row=5, column=1, sticky="w")
         ttk.Checkbutton(frm_top, text="关闭 HTTP/2（避免 TLS/EOF 报错）", variable=self.disable_h2).grid(row=5, column=2, sticky="w")
+        ttk.Checkbutton(frm_top, text="hf_transfer 加速", variable=self.use_hf_transfer).grid(row=5, column=3, sticky="w")
 
         frm_mid = ttk.LabelFrame(self, text="下载范围（按字典序子目录下标，左闭右闭）")
         frm_mid.pack(fill="x", **pad)
@@ -117,6 +256,12 @@ class App(tk.Tk):
         ttk.Label(frm_mid, textvariable=self.count_var).grid(row=0, column=4, sticky="w")
 
         ttk.Button(frm_mid, text="浏览子目录", command=self.list_subdirs_action).grid(row=0, column=5, **pad)
+        ttk.Button(frm_mid, text="刷新（忽略缓存）",
+                   command=lambda: self.list_subdirs_action(refresh=True)).grid(row=0, column=6, **pad)
+
+        ttk.Label(frm_mid, text="并发子目录数:").grid(row=1, column=0, sticky="e")
+        self.parallel_var = tk.IntVar(value=4)
+        ttk.Spinbox(frm_mid, from_=1, to=16, textvariable=self.parallel_var, width=8).grid(row=1, column=1, sticky="w", **pad)
 
         frm_btn = ttk.Frame(self)
         frm_btn.pack(fill="x", **pad)
@@ -147,59 +292,140 @@ class App(tk.Tk):
             self.local_entry.delete(0, "end")
             self.local_entry.insert(0, d)
 
-    # 输出日志
+    # 输出日志（任意线程均可调用）
     def log(self, s: str):
-        self.log_txt.insert("end", s.rstrip() + "\n")
-        self.log_txt.see("end")
-        self.update_idletasks()
+        self._ui_queue.put(("log", s.rstrip()))
+
+    # 把控件操作转交主线程执行（工作线程中不直接碰 Tk）
+    def _ui(self, fn, *a):
+        self.after(0, lambda: fn(*a))
+
+    # 进度条（任意线程均可调用）
+    def _pb_reset(self, maximum: int):
+        self._ui_queue.put(("reset", maximum))
+
+    def _pb_step(self, n: int = 1):
+        self._ui_queue.put(("step", n))
 
-    # 设置环境变量（镜像/HTTP2）
+    # 主线程：每 100ms 取空队列，日志合并为一次 insert，进度累计后一次 step
+    def _drain_ui_queue(self):
+        lines = deque(maxlen=LOG_MAX_LINES)  # 单批次超出上限的旧行直接丢弃，不进 Text
+        steps = 0
+        try:
+            while True:
+                kind, val = self._ui_queue.get_nowait()
+                if kind == "log":
+                    lines.append(val)
+                elif kind == "step":
+                    steps += val
+                elif kind == "reset":
+                    steps = 0
+                    self.pb.config(maximum=val, value=0)
+        except queue.Empty:
+            pass
+        if lines:
+            self.log_txt.insert("end", "\n".join(lines) + "\n")
+            # 超出上限时从头部截断，避免长时间下载后 Text 越来越慢
+            n = int(self.log_txt.index("end-1c").split(".")[0])
+            if n > LOG_MAX_LINES:
+                self.log_txt.delete("1.0", f"{n - LOG_MAX_LINES}.0")
+            self.log_txt.see("end")
+        if steps:  # 不用 step()：到达 maximum 时它会回绕到 0
+            self.pb.config(value=min(float(self.pb["value"]) + steps, float(self.pb["maximum"])))
+        self.after(100, self._drain_ui_queue)
+
+    # 设置环境变量（镜像/HTTP2/hf_transfer）
     def apply_env(self):
-        if self.use_mirror.get():
-            os.environ["HF_ENDPOINT"] = "https://hf-mirror.com"
-        else:
-            os.environ.pop("HF_ENDPOINT", None)
-        if self.disable_h2.get():
-            os.environ["HF_HUB_DISABLE_HTTP2"] = "1"
-        else:
-            os.environ.pop("HF_HUB_DISABLE_HTTP2", None)
+        use_transfer = self.use_hf_transfer.get()
+        if use_transfer and not HAS_HF_TRANSFER:
+            self.log("[WARN] 未安装 hf_transfer，已使用默认下载。可执行：pip install hf_transfer")
+            use_transfer = False
+
+        # None 表示删除该变量
+        desired = {
+            "HF_ENDPOINT": "https://hf-mirror.com" if self.use_mirror.get() else None,
+            "HF_HUB_DISABLE_HTTP2": "1" if self.disable_h2.get() else None,
+            "HF_HUB_ENABLE_HF_TRANSFER": "1" if use_transfer else None,
+            "HF_XET_HIGH_PERFORMANCE": "1" if use_transfer else None,  # 新版 xet 后端的高吞吐模式
+        }
+        for k, v in desired.items():
+            if self._current_env.get(k) == v:
+                continue
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+            self._current_env[k] = v
+        # huggingface_hub 在 import 时读取该变量，运行中切换需同步到 constants
+        hf_constants.HF_HUB_ENABLE_HF_TRANSFER = use_transfer
 
     # 浏览子目录
-    def list_subdirs_action(self):
+    # 读取界面输入后交给后台线程列目录（网络请求与失败重试的等待不阻塞界面），结果经 _ui 回到主线程
+    def list_subdirs_action(self, refresh: bool = False):
+        if self._listing:
+            return
         try:
             self.apply_env()
-            repo = self.repo_entry.get().strip()
-            rev = self.rev_entry.get().strip()
-            remote = self.remote_entry.get().strip()
-            token = self.token_entry.get().strip() or None
-            if token:
+        except Exception as e:
+            self._on_list_failed(e)
+            return
+        repo = self.repo_entry.get().strip()
+        rev = self.rev_entry.get().strip()
+        remote = self.remote_entry.get().strip()
+        token = self.token_entry.get().strip() or None
+        self._listing = True
+        threading.Thread(target=self._list_subdirs_worker,
+                         args=(repo, rev, remote, token, refresh), daemon=True).start()
+
+    def _list_subdirs_worker(self, repo, rev, remote, token, refresh):
+        try:
+            token_hash = self._token_hash(token)
+            if token and token_hash != self._login_token_hash:
                 try:
                     hf_login(token=token)  # 写入本机缓存（安全：仅当前用户）
+                    self._login_token_hash = token_hash
                 except Exception as e:
                     self.log(f"[WARN] 登录失败（但不阻塞浏览）：{e}")
 
-            base_url = os.environ.get("HF_ENDPOINT", "https://huggingface.co")
-            api = HfApi(endpoint=base_url)  # 强制使用镜像或官方
+            api = self._get_api(token)
 
             self.log(f"[INFO] 正在列出 {repo}@{rev} -> {remote} 的子目录 ...")
-            dirs = list_first_level_dirs(api, repo, rev, remote)
-            self.subdirs = dirs
-            self.count_var.set(f"子目录数量：{len(dirs)}")
-            self.log(f"[OK] 共 {len(dirs)} 个子目录。")
-            if len(dirs) > 0:
-                self.start_btn.config(state="normal")
-                self.check_btn.config(state="normal")
-                self.fill_missing_btn.config(state="normal")
-            else:
-                self.start_btn.config(state="disabled")
-                self.check_btn.config(state="disabled")
-                self.fill_missing_btn.config(state="disabled")
+            dirs, from_cache = cached_list_dirs(api, repo, rev, remote, refresh=refresh)
         except Exception as e:
-            self.start_btn.config(state="disabled")
-            self.check_btn.config(state="disabled")
-            self.fill_missing_btn.config(state="disabled")
-            messagebox.showerror("错误", f"浏览子目录失败：\n{e}")
-            self.log(f"[ERROR] 浏览子目录失败：{e}")
+            self._ui(self._on_list_failed, e)
+            return
+        self._ui(self._on_subdirs_listed, dirs, from_cache)
+
+    def _on_subdirs_listed(self, dirs, from_cache):
+        self._listing = False
+        self.subdirs = dirs
+        self.count_var.set(f"子目录数量：{len(dirs)}")
+        self.log(f"[OK] 共 {len(dirs)} 个子目录。" + ("（来自本地缓存，可点『刷新』重新获取）" if from_cache else ""))
+        state = "normal" if len(dirs) > 0 else "disabled"
+        self.start_btn.config(state=state)
+        self.check_btn.config(state=state)
+        self.fill_missing_btn.config(state=state)
+
+    def _on_list_failed(self, e):
+        self._listing = False
+        self.start_btn.config(state="disabled")
+        self.check_btn.config(state="disabled")
+        self.fill_missing_btn.config(state="disabled")
+        messagebox.showerror("错误", f"浏览子目录失败：\n{e}")
+        self.log(f"[ERROR] 浏览子目录失败：{e}")
+
+    @staticmethod
+    def _token_hash(token) -> str:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).hexdigest() if isinstance(token, str) and token else ""
+
+    # 按 (endpoint, token 摘要) 复用 HfApi
+    def _get_api(self, token) -> HfApi:
+        base_url = self._current_env["HF_ENDPOINT"] or "https://huggingface.co"
+        key = (base_url, self._token_hash(token))
+        api = self._api_cache.get(key)
+        if api is None:
+            api = self._api_cache[key] = HfApi(endpoint=base_url)  # 强制使用镜像或官方
+        return api
 
     # 启动下载线程（全范围）
     def start_download_thread(self):
@@ -212,7 +438,7 @@ class App(tk.Tk):
     def download_worker(self):
         try:
             self.downloading = True
-            self._toggle_buttons(False)
+            self._ui(self._toggle_buttons, False)
             self.apply_env()
 
             repo = self.repo_entry.get().strip()
@@ -220,77 +446,223 @@ class App(tk.Tk):
             remote = self.remote_entry.get().strip()
             token = self.token_entry.get().strip() or True  # True：用缓存或环境变量
             local_root = Path(self.local_entry.get().strip()).expanduser()
-            local_root.mkdir(parents=True, exist_ok=True)
 
             # 处理索引范围
             try:
                 si = int(self.start_entry.get().strip())
                 ei = int(self.end_entry.get().strip())
             except ValueError:
-                messagebox.showerror("错误", "start_index / end_index 必须是整数")
+                self._ui(messagebox.showerror, "错误", "start_index / end_index 必须是整数")
                 self.log("[ERROR] start_index / end_index 必须是整数")
                 return
 
             if not self.subdirs:
-                messagebox.showwarning("提示", "请先点击『浏览子目录』获取列表。")
+                self._ui(messagebox.showwarning, "提示", "请先点击『浏览子目录』获取列表。")
                 self.log("[WARN] 未获取到子目录，请先『浏览子目录』。")
                 return
 
             if si < 0 or ei < si or si >= len(self.subdirs):
-                messagebox.showerror("错误", f"索引范围不合法（共有 {len(self.subdirs)} 个子目录）")
+                self._ui(messagebox.showerror, "错误", f"索引范围不合法（共有 {len(self.subdirs)} 个子目录）")
                 self.log("[ERROR] 索引范围不合法。")
                 return
 
             ei = min(ei, len(self.subdirs) - 1)
             slice_dirs = self.subdirs[si:ei + 1]
             out_dir = local_root / f"CT-RATE_download_{si}-{ei}"
-            out_dir.mkdir(parents=True, exist_ok=True)
+            self._prepare_dirs(out_dir, slice_dirs)
 
             total = len(slice_dirs)
-            self.pb.config(maximum=total, value=0)
+            self._pb_reset(total)
             self.log(f"[INFO] 计划下载 {total} 个子目录，输出到：{out_dir}")
 
-            ok = 0
-            for idx, d in enumerate(slice_dirs, 1):
-                allow_patterns = [f"{d}/**"]
-                self.log(f"[{idx}/{total}] 下载：{d} ...")
-                try:
-                    snapshot_download(
-                        repo_id=repo,
-                        repo_type="dataset",
-                        revision=rev,
-                        local_dir=str(out_dir),
-                        max_workers=2,
-                        etag_timeout=30,
-                        allow_patterns=allow_patterns,
-                        ignore_patterns=[".git/*"],
-                        token=token,
-                    )
-                    ok += 1
-                    self.log(f"  -> 完成：{d}")
-                except Exception as e:
-                    self.log(f"  -> 失败：{d} | {e}")
-                finally:
-                    self.pb.step(1)
-                    self.update_idletasks()
+            ok = self._download_dirs(repo, rev, token, out_dir, slice_dirs, "下载")
 
             self.log(f"[DONE] 完成 {ok}/{total} 个子目录。保存于：{out_dir}")
             if ok == 0:
                 self.log("  * 如遇 401/403，请确认：已在网页 Access/Agree、token 具备 Read 权限、当前机器已登录。")
         finally:
             self.downloading = False
-            self._toggle_buttons(True)
+            self._ui(self._toggle_buttons, True)
+
+    # 下载前一次性建好输出目录及各子目录（由浅到深），池内线程不再各自 mkdir 竞争公共父目录
+    @staticmethod
+    def _prepare_dirs(out_dir: Path, dirs):
+        all_dirs = {out_dir} | {out_dir / d for d in dirs}
+        for p in sorted(all_dirs, key=lambda p: len(p.parts)):
+            p.mkdir(parents=True, exist_ok=True)
+
+    # 下载单个子目录（在线程池中执行）
+    def _download_one(self, repo, rev, token, out_dir, d):
+        snapshot_download(
+            repo_id=repo,
+            repo_type="dataset",
+            revision=rev,
+            local_dir=str(out_dir),
+            max_workers=4,
+            etag_timeout=30,
+            allow_patterns=[f"{d}/**"],
+            ignore_patterns=[".git/*"],
+            token=token,
+        )
+        mark_dir_done(out_dir / d, rev)
+
+    # 子目录内的文件列表（缓存；失败返回空列表且不缓存）
+    def _list_dir_files(self, repo, rev, token, d):
+        key = (repo, rev, d)
+        files = self._repo_tree_cache.get(key)
+        if files is None:
+            try:
+                tree = self._get_api(token).list_repo_tree(
+                    repo_id=repo, repo_type="dataset", revision=rev,
+                    path_in_repo=d, recursive=True, token=token,
+                )
+                files = [e.path for e in tree if getattr(e, "type", "") == "file"]
+            except Exception:
+                return []
+            if files:
+                self._repo_tree_cache[key] = files
+        return files
+
+    # 只列出本子目录的文件，再逐文件 hf_hub_download（snapshot_download 每次都要取整个仓库的文件清单）；
+    # 文件下载提交到共享池，多个子目录并发时总连接数仍受 16 限制。列文件失败时回退 snapshot_download
+    def _download_one_files(self, repo, rev, token, out_dir, d, file_pool):
+        files = self._list_dir_files(repo, rev, token, d)
+        if not files:
+            self._download_one(repo, rev, token, out_dir, d)
+            return
+
+        def fetch(filename):
+            if self._closing:  # Python < 3.9 无法随线程池关闭取消排队任务，在此兜底
+                raise RuntimeError("窗口已关闭，取消下载")
+            hf_hub_download(
+                repo_id=repo,
+                repo_type="dataset",
+                revision=rev,
+                filename=filename,
+                local_dir=str(out_dir),
+                etag_timeout=30,
+                token=token,
+            )
+
+        futures = [file_pool.submit(fetch, name) for name in files]
+        try:
+            for fut in futures:  # 任一文件失败即抛出
+                fut.result()
+        except BaseException:
+            for fut in futures:  # 同一子目录中尚未开始的文件不再下载
+                fut.cancel()
+            raise
+        mark_dir_done(out_dir / d, rev)
+
+    # 并发下载多个子目录；各子目录相互独立且受网络延迟约束，用线程池重叠等待
+    def _download_dirs(self, repo, rev, token, out_dir, dirs, label):
+        try:
+            n_workers = max(1, int(self.parallel_var.get()))
+        except (tk.TclError, ValueError):
+            n_workers = 4
+        total = len(dirs)
+        # 已有同一 revision 完成标记的子目录直接跳过，不再为其逐文件发 HEAD 请求
+        todo = [d for d in dirs if not is_dir_done(out_dir / d, rev)]
+        ok = total - len(todo)
+        done = ok
+        if ok:
+            self.log(f"[INFO] 跳过 {ok} 个已完成的子目录")
+            self._pb_step(ok)
+        self.log(f"[INFO] {label}：{len(todo)} 个子目录，并发 {n_workers}")
+        # 界面更新只在当前（消费结果的）线程进行，池内线程只负责下载；
+        # 两个池都按本次“并发子目录数”创建，用完即关闭
+        dir_pool = ThreadPoolExecutor(max_workers=n_workers)
+        file_pool = ThreadPoolExecutor(max_workers=n_workers * FILES_PER_DIR)
+        self._pools = [dir_pool, file_pool]
+        try:
+            futures = {dir_pool.submit(self._download_one_files, repo, rev, token, out_dir, d, file_pool): d
+                       for d in todo}
+            for fut in as_completed(futures):
+                d = futures[fut]
+                done += 1
+                try:
+                    fut.result()
+                    ok += 1
+                    self.log(f"[{done}/{total}] {label}完成：{d}")
+                except Exception as e:
+                    self.log(f"[{done}/{total}] {label}失败：{d} | {e}")
+                finally:
+                    self._pb_step(1)
+        finally:
+            self._pools = []
+            dir_pool.shutdown(wait=False)
+            file_pool.shutdown(wait=False)
+        return ok
 
-    # NEW: 判断目录内是否包含至少一个实际文件（排除隐藏）
+    def _shutdown_pools(self):
+        for pool in self._pools:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except TypeError:  # Python < 3.9 无 cancel_futures
+                pool.shutdown(wait=False)
+
+    # 关闭窗口：取消排队中的下载，否则解释器退出时会等线程池把队列跑完，留下无界面的后台进程
+    def _on_close(self):
+        self._closing = True
+        self._shutdown_pools()
+        self.destroy()
+
+    # 合并下载：一次 snapshot_download 覆盖全部目录（只拉一次仓库元数据、共用一个下载池），
+    # 之后按目录复查，未落盘的再逐个下载，便于定位具体失败项
+    def _download_batch(self, repo, rev, token, out_dir, dirs):
+        if len(dirs) == 1:  # 单个目录无需合并，直接走逐文件下载
+            return self._download_dirs(repo, rev, token, out_dir, dirs, "下载缺失")
+        self.log(f"[INFO] 合并下载 {len(dirs)} 个子目录……")
+        batch_ok = False
+        try:
+            snapshot_download(
+                repo_id=repo,
+                repo_type="dataset",
+                revision=rev,
+                local_dir=str(out_dir),
+                max_workers=8,
+                etag_timeout=30,
+                allow_patterns=[f"{d}/**" for d in dirs],
+                ignore_patterns=[".git/*"],
+                token=token,
+            )
+            batch_ok = True
+        except Exception as e:
+            self.log(f"[WARN] 合并下载失败，改为逐个下载：{e}")
+
+        if batch_ok:  # 合并调用无异常，说明已落盘的目录都完整
+            with ThreadPoolExecutor(max_workers=16) as ex:
+                present = list(ex.map(self._dir_has_any_file, (out_dir / d for d in dirs)))
+            remaining = [d for d, has_file in zip(dirs, present) if not has_file]
+            for d, has_file in zip(dirs, present):
+                if has_file:
+                    mark_dir_done(out_dir / d, rev)
+        else:
+            # 中途失败时，已有文件的目录可能只下了一半：全部交给逐个下载，
+            # 由 _download_dirs 按完成标记跳过此前已确认完整的目录
+            remaining = list(dirs)
+        ok = len(dirs) - len(remaining)
+        self._pb_step(ok)
+        if remaining:
+            ok += self._download_dirs(repo, rev, token, out_dir, remaining, "下载缺失")
+        return ok
+
+    # NEW: 判断目录内是否包含至少一个实际文件（排除隐藏）；找到第一个即返回，不遍历整棵子树
     def _dir_has_any_file(self, p: Path) -> bool:
-        if not p.exists() or not p.is_dir():
+        try:
+            with os.scandir(p) as it:
+                for e in it:
+                    if e.name.startswith("."):
+                        continue
+                    if e.is_file(follow_symlinks=False):
+                        return True
+                    if e.is_dir(follow_symlinks=False) and self._dir_has_any_file(Path(e.path)):
+                        return True
+        except OSError:  # 不存在 / 不是目录 / 无权限
             return False
-        for sub in p.rglob("*"):
-            if sub.is_file() and not sub.name.startswith("."):
-                return True
         return False
 
-    # NEW: 计算当前范围内缺失的 train_xx 列表（返回 repo 内路径 & 简名）
+    # NEW: 逐项检查当前范围内的 train_xx，返回 (out_dir, [(repo 内路径, 简名, 本地路径, 是否已有文件), ...])
     def _collect_missing(self):
         if not self.subdirs:
             raise RuntimeError("未获取到子目录列表，请先『浏览子目录』。")
@@ -310,39 +682,38 @@ class App(tk.Tk):
         local_root = Path(self.local_entry.get().strip()).expanduser()
         out_dir = local_root / f"CT-RATE_download_{si}-{ei}"
 
-        missing_repo_paths = []
-        missing_names = []
+        fulls = [out_dir / d for d in slice_dirs]  # out_dir/dataset/train/train_xx
 
-        for d in slice_dirs:
-            full = out_dir / d  # out_dir/dataset/train/train_xx
-            if not self._dir_has_any_file(full):
-                missing_repo_paths.append(d)          # 形如 dataset/train/train_xx
-                missing_names.append(d.split("/")[-1])  # 形如 train_xx
+        # 各目录的探测互不相关且受文件系统延迟约束（网络盘 / HDD），用线程池并行
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            present = list(ex.map(self._dir_has_any_file, fulls))
 
-        return out_dir, missing_repo_paths, missing_names
+        # d 形如 dataset/train/train_xx，简名形如 train_xx
+        entries = [(d, d.rsplit("/", 1)[-1], full, has_file)
+                   for d, full, has_file in zip(slice_dirs, fulls, present)]
+        return out_dir, entries
 
     # NEW: 检查未下载项目（仅展示）
     def check_missing_action(self):
         try:
-            out_dir, missing_repo_paths, missing_names = self._collect_missing()
-            total = (int(self.end_entry.get()) - int(self.start_entry.get()) + 1)
-            ok_cnt = total - len(missing_repo_paths)
+            out_dir, entries = self._collect_missing()
+            total = len(entries)
             self.log(f"[CHECK] 扫描本地：{out_dir}")
             self.log("  期望目录\t\t状态\t\t本地路径")
             self.log("  ----------\t\t----\t\t--------")
 
-            # 重新打印每一项状态
-            si = int(self.start_entry.get()); ei = int(self.end_entry.get())
-            slice_dirs = self.subdirs[si:ei + 1]
-            for d in slice_dirs:
-                full = out_dir / d
-                train_name = d.split("/")[-1]
-                status = "MISSING" if train_name in missing_names else "OK"
+            # 单次遍历：打印每一项状态并收集缺失项
+            missing_names = []
+            for d, train_name, full, has_file in entries:
+                if not has_file:
+                    missing_names.append(train_name)
+                status = "OK" if has_file else "MISSING"
                 self.log(f"  {train_name:<16}\t{status:<8}\t{full}")
+            ok_cnt = total - len(missing_names)
 
-            self.log(f"[RESULT] OK: {ok_cnt}/{total} | MISSING: {len(missing_repo_paths)}")
-            if missing_repo_paths:
-                messagebox.showwarning("检查结果", f"缺失 {len(missing_repo_paths)}/{total} 个：\n" + ", ".join(missing_names))
+            self.log(f"[RESULT] OK: {ok_cnt}/{total} | MISSING: {len(missing_names)}")
+            if missing_names:
+                messagebox.showwarning("检查结果", f"缺失 {len(missing_names)}/{total} 个：\n" + ", ".join(missing_names))
             else:
                 messagebox.showinfo("检查结果", f"全部就绪：{ok_cnt}/{total} 个子目录均存在且包含文件。")
         except Exception as e:
@@ -360,54 +731,35 @@ class App(tk.Tk):
     def _download_missing_worker(self):
         try:
             self.downloading = True
-            self._toggle_buttons(False)
+            self._ui(self._toggle_buttons, False)
             self.apply_env()
 
             repo = self.repo_entry.get().strip()
             rev = self.rev_entry.get().strip()
             token = self.token_entry.get().strip() or True
-            out_dir, missing_repo_paths, missing_names = self._collect_missing()
+            out_dir, entries = self._collect_missing()
+            missing_repo_paths = [d for d, _, _, has_file in entries if not has_file]
 
             if not missing_repo_paths:
                 self.log("[INFO] 没有缺失项需要下载。")
-                messagebox.showinfo("下载未下载项", "没有发现缺失项。")
+                self._ui(messagebox.showinfo, "下载未下载项", "没有发现缺失项。")
                 return
 
+            self._prepare_dirs(out_dir, missing_repo_paths)
             self.log(f"[INFO] 仅下载缺失的 {len(missing_repo_paths)} 个目录 -> {out_dir}")
-            self.pb.config(maximum=len(missing_repo_paths), value=0)
+            self._pb_reset(len(missing_repo_paths))
 
-            ok = 0
-            for idx, d in enumerate(missing_repo_paths, 1):
-                self.log(f"[{idx}/{len(missing_repo_paths)}] 下载缺失：{d} ...")
-                try:
-                    snapshot_download(
-                        repo_id=repo,
-                        repo_type="dataset",
-                        revision=rev,
-                        local_dir=str(out_dir),
-                        max_workers=2,
-                        etag_timeout=30,
-                        allow_patterns=[f"{d}/**"],
-                        ignore_patterns=[".git/*"],
-                        token=token,
-                    )
-                    ok += 1
-                    self.log(f"  -> 完成：{d}")
-                except Exception as e:
-                    self.log(f"  -> 失败：{d} | {e}")
-                finally:
-                    self.pb.step(1)
-                    self.update_idletasks()
+            ok = self._download_batch(repo, rev, token, out_dir, missing_repo_paths)
 
             self.log(f"[DONE] 缺失项下载完成：{ok}/{len(missing_repo_paths)}")
             if ok < len(missing_repo_paths):
                 self.log("  * 如遇 401/403，请确认：已在网页 Access/Agree、token 具备 Read 权限、当前机器已登录。")
         except Exception as e:
-            messagebox.showerror("错误", f"下载未下载项时出错：\n{e}")
+            self._ui(messagebox.showerror, "错误", f"下载未下载项时出错：\n{e}")
             self.log(f"[ERROR] 下载未下载项失败：{e}")
         finally:
             self.downloading = False
-            self._toggle_buttons(True)
+            self._ui(self._toggle_buttons, True)
 
     # NEW: 统一开关按钮状态
     def _toggle_buttons(self, enabled: bool):
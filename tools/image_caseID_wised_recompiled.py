@@ -1,57 +1,130 @@
 import os
 import sys
+import errno
+import queue
 import shutil
 import random
 import threading
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
 APP_TITLE = "NII按CASE整理工具（root扫描 / 位置切片匹配 / 预览与复制）"
+SCAN_WORKERS = 8  # 并行遍历目录的线程数（网络盘上元数据请求可并发）
+LIST_BATCH = 500  # 扫描列表每次定时刷新最多插入的行数
+COPY_WORKERS = 8  # 并发复制的线程数
+NII_SUFFIX_LEN = 7  # len(".nii.gz")
 
 def is_nii_gz(p: Path) -> bool:
-    return p.name.lower().endswith(".nii.gz")
-
-def walk_nii_gz(root: Path):
-    """返回 (path, is_deep) 列表；is_deep 表示是否为root下多级目录文件"""
-    res = []
-    root = root.resolve()
-    for dirpath, _, filenames in os.walk(root):
-        for fn in filenames:
-            if fn.lower().endswith(".nii.gz"):
-                p = Path(dirpath) / fn
-                # 相对 root 的层级是否>1（即不在 root 的第一层）
-                rel = p.parent.relative_to(root)
-                is_deep = len(rel.parts) > 0  # 只要不在root根目录，就算“深层”
-                res.append((p, is_deep))
-    return res
-
-def ensure_unique(dst_path: Path) -> Path:
-    """若文件已存在，自动追加 _1, _2,... 直到唯一"""
-    if not dst_path.exists():
-        return dst_path
-    stem = dst_path.name[:-7] if dst_path.name.lower().endswith(".nii.gz") else dst_path.stem
-    suffix = ".nii.gz" if dst_path.name.lower().endswith(".nii.gz") else dst_path.suffix
-    parent = dst_path.parent
-    i = 1
-    while True:
-        candidate = parent / f"{stem}_{i}{suffix}"
-        if not candidate.exists():
-            return candidate
-        i += 1
-
-def safe_copy_file(src: Path, dst: Path, overwrite: bool):
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    if dst.exists():
+    return p.name[-NII_SUFFIX_LEN:].lower() == ".nii.gz"
+
+def _scan_dir(path: str, depth: int, out_q):
+    """列出单个目录：命中的 .nii.gz 以 (path, is_deep, 文件名去扩展名) 放入 out_q，返回子目录列表（无权限等错误时跳过，同 os.walk）"""
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    subdirs.append(e.path)
+                elif e.name[-NII_SUFFIX_LEN:].lower() == ".nii.gz" and e.is_file():
+                    out_q.put((e.path, depth > 0, e.name[:-NII_SUFFIX_LEN]))
+    except OSError:
+        pass
+    return depth + 1, subdirs
+
+def scan_parallel(root: Path, out_q, workers: int = SCAN_WORKERS):
+    """线程池并行遍历：每个目录一个任务，发现的子目录再提交回池；结果逐个放入 out_q"""
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        pending = {ex.submit(_scan_dir, os.path.realpath(root), 0, out_q)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                depth, subdirs = fut.result()
+                for d in subdirs:
+                    pending.add(ex.submit(_scan_dir, d, depth, out_q))
+
+def name_key(name: str) -> str:
+    """重名判断用的键：Windows 由 normcase 处理；macOS 默认的 APFS / HFS+ 不区分大小写，而 normcase 在 macOS 上不转小写"""
+    key = os.path.normcase(name)
+    return key.lower() if sys.platform == "darwin" else key
+
+def ensure_unique(dst_path: str, dir_cache=None) -> str:
+    """
+    若文件已存在，自动追加 _1, _2,... 直到唯一
+    传入 dir_cache（{目录: 文件名集合}）时：每个目录首次用到时 listdir 一次，之后只查集合不再 stat，
+    并把选中的文件名登记进去（同一批次内后来者也会避开）
+    """
+    parent, name = os.path.split(dst_path)
+    if dir_cache is None:
+        def free(n):
+            return not os.path.exists(os.path.join(parent, n))
+    else:
+        names = dir_cache.get(parent)
+        if names is None:
+            try:
+                names = {name_key(x) for x in os.listdir(parent)}
+            except OSError:  # 目录尚不存在
+                names = set()
+            dir_cache[parent] = names
+
+        def free(n):
+            return name_key(n) not in names
+
+    chosen = name
+    if not free(chosen):
+        if name[-NII_SUFFIX_LEN:].lower() == ".nii.gz":
+            stem, suffix = name[:-NII_SUFFIX_LEN], ".nii.gz"
+        else:
+            stem, suffix = os.path.splitext(name)
+        i = 1
+        while not free(f"{stem}_{i}{suffix}"):
+            i += 1
+        chosen = f"{stem}_{i}{suffix}"
+    if dir_cache is not None:
+        names.add(name_key(chosen))
+    return os.path.join(parent, chosen)
+
+# copy_file_range 不支持的情形（跨文件系统 / 内核或文件系统不支持）→ 回退 shutil.copy2
+_CFR_FALLBACK = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+def fast_copy(src, dst):
+    """
+    Linux 上用 os.copy_file_range 在内核中复制（无用户态缓冲，btrfs/XFS 可 reflink，NFS 4.2 可服务端复制），
+    再复制元数据；其他平台或不支持时使用 shutil.copy2
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                infd, outfd = fsrc.fileno(), fdst.fileno()
+                remaining = os.fstat(infd).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(infd, outfd, min(remaining, 1 << 30))
+                    if n == 0:  # 部分文件系统（overlayfs / 某些 FUSE、NFS）会提前返回 0
+                        break
+                    remaining -= n
+            if remaining == 0:
+                shutil.copystat(src, dst)
+                return
+            # 未复制完整：不能当作成功，交给下面的 shutil.copy2 重新完整复制
+        except OSError as e:
+            if e.errno not in _CFR_FALLBACK:
+                raise
+    shutil.copy2(src, dst)
+
+def safe_copy_file(src: str, dst: str, overwrite: bool):
+    """目标目录需由调用方事先建好"""
+    if os.path.exists(dst):
         if overwrite:
-            shutil.copy2(src, dst)
+            fast_copy(src, dst)
             return dst
         else:
             dst = ensure_unique(dst)
-            shutil.copy2(src, dst)
+            fast_copy(src, dst)
             return dst
     else:
-        shutil.copy2(src, dst)
+        fast_copy(src, dst)
         return dst
 
 class App(tk.Tk):
@@ -68,11 +141,27 @@ class App(tk.Tk):
         self.snippet = tk.StringVar()
         self.flatten_deep = tk.BooleanVar(value=False)  # 统一转移至root
         self.overwrite = tk.BooleanVar(value=False)     # 目标重复时是否覆盖
-        self.scan_results = []  # [(Path, is_deep)]
-        self.group_map = {}     # {ID: [Path,...]}
+        self.scan_results = []  # [(str, is_deep, 文件名去扩展名)]
+        self.group_map = defaultdict(list)  # {ID: [str,...]}
         self.example_path = None
+        self._example_stem = ""
+        self._scan_q = None     # 后台扫描结果队列；None 表示当前未在扫描
+        self._dir_contents_cache = {}  # {目标目录: 已有文件名集合}，每次执行复制时重建
+        # 日志与进度：任意线程只写缓冲，主线程每 100ms 统一刷新到控件
+        self._log_buf = deque()
+        self._progress = 0
+        self._scan_done = False
+        self._deep_count = 0     # 扫描过程中累计的深层文件数
+        self._pending = deque()  # 已收到、尚未插入 Listbox 的结果
+        # _flat：分组后按 ID、路径排好序的 [(ID, path)]，只在分组时排序一次，预览与复制共用
+        # 预览表按需渲染：Treeview 只保留可见窗口内的行
+        self._flat = []
+        self._preview_n = 0      # 当前可预览的行数（未预览时为 0）
+        self._preview_dst = ""
+        self._view_first = 0
 
         self._build_ui()
+        self.after(100, self._flush_ui)
 
     def _build_ui(self):
         top = ttk.Frame(self, padding=8)
@@ -155,8 +244,12 @@ class App(tk.Tk):
         self.tree.column("dst", width=320, anchor="w")
         self.tree.column("id", width=200, anchor="w")
         self.tree.column("file", width=440, anchor="w")
-        y2 = ttk.Scrollbar(bottom, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=y2.set)
+        y2 = ttk.Scrollbar(bottom, orient=tk.VERTICAL, command=self._on_tree_scroll)
+        self._tree_scroll = y2
+        self.tree.bind("<Configure>", lambda e: self._refresh_viewport())
+        self.tree.bind("<MouseWheel>", self._on_tree_wheel)
+        self.tree.bind("<Button-4>", self._on_tree_wheel)
+        self.tree.bind("<Button-5>", self._on_tree_wheel)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(6,0), pady=6)
         y2.pack(side=tk.LEFT, fill=tk.Y, pady=6, padx=(0,6))
 
@@ -185,12 +278,12 @@ class App(tk.Tk):
         if d:
             self.dst_dir.set(d)
 
-    def append_scan_list(self):
-        self.scan_list.delete(0, tk.END)
-        for p, deep in self.scan_results:
-            tag = "[深层] " if deep else ""
-            self.scan_list.insert(tk.END, f"{tag}{str(p)}")
-        self.scan_list.insert(tk.END, f"—— 共计 {len(self.scan_results)} 个 .nii.gz ——")
+    def _pump_list(self):
+        """每次最多插入 LIST_BATCH 行，一次 insert 调用完成"""
+        n = min(LIST_BATCH, len(self._pending))
+        if n:
+            batch = [self._pending.popleft() for _ in range(n)]
+            self.scan_list.insert(tk.END, *(f"{'[深层] ' if deep else ''}{p}" for p, deep, _ in batch))
 
     def scan_files(self):
         root = self.root_dir.get().strip()
@@ -202,18 +295,60 @@ class App(tk.Tk):
             messagebox.showerror("错误", "root 路径不存在。")
             return
 
-        self.scan_results = walk_nii_gz(rootp)
-        self.append_scan_list()
+        if self._scan_q is not None:
+            return  # 上一次扫描尚未结束
+
+        self.scan_results = []
+        self._pending.clear()
+        self._scan_done = False
+        self._deep_count = 0
+        self.scan_list.delete(0, tk.END)
         self.example_path = None
         self.example_label.config(text="（示例路径将显示在这里）")
         self.group_map.clear()
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self._flat = []
+        self._preview_n = 0
+        self._refresh_viewport()
         self.log_delete()
-        self.log_write(f"[INFO] 扫描完成：共 {len(self.scan_results)} 个 .nii.gz；其中深层：{sum(1 for _,d in self.scan_results if d)}\n")
+        self.log_write("[INFO] 正在扫描……\n")
+
+        # 遍历在后台线程池中进行，主线程每 30ms 取一次结果并分批插入，界面不冻结
+        q = self._scan_q = queue.Queue()
+
+        def worker():
+            try:
+                scan_parallel(rootp, q)
+            finally:
+                q.put(None)  # 结束标记
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.after(30, self._drain_scan)
+
+    def _drain_scan(self):
+        q = self._scan_q
+        try:
+            while not self._scan_done:
+                item = q.get_nowait()
+                if item is None:
+                    self._scan_done = True
+                    break
+                self.scan_results.append(item)
+                self._pending.append(item)
+                self._deep_count += item[1]
+        except queue.Empty:
+            pass
+        self._pump_list()
+        # 生产者结束且列表已全部插入后，才写汇总行
+        if not self._scan_done or self._pending:
+            self.after(30, self._drain_scan)
+            return
+
+        self._scan_q = None
+        self.scan_list.insert(tk.END, f"—— 共计 {len(self.scan_results)} 个 .nii.gz ——")
+        self.log_write(f"[INFO] 扫描完成：共 {len(self.scan_results)} 个 .nii.gz；其中深层：{self._deep_count}\n")
 
         # 如用户勾选“统一转移至root”，此处仅询问（真正执行在“确认开始复制”时）
-        if any(d for _, d in self.scan_results):
+        if self._deep_count:
             if self.flatten_deep.get():
                 self.log_write("[HINT] 已勾选：稍后会先将深层文件统一拷贝到 root 再进行整理。\n")
             else:
@@ -223,8 +358,8 @@ class App(tk.Tk):
         if not self.scan_results:
             messagebox.showwarning("提示", "请先扫描 .nii.gz。")
             return
-        self.example_path = random.choice(self.scan_results)[0]
-        self.example_label.config(text=str(self.example_path))
+        self.example_path, _, self._example_stem = random.choice(self.scan_results)
+        self.example_label.config(text=self.example_path)
 
     def locate_slice_by_snippet(self):
         if not self.example_path:
@@ -234,7 +369,7 @@ class App(tk.Tk):
         if not snip:
             messagebox.showwarning("提示", "请先输入片段（例如 Breast_001）。")
             return
-        name_no_ext = self.example_path.name[:-7] if self.example_path.name.lower().endswith(".nii.gz") else self.example_path.stem
+        name_no_ext = self._example_stem  # 扫描时已去掉 .nii.gz
         idx = name_no_ext.find(snip)
         if idx < 0:
             messagebox.showerror("未找到", f"片段“{snip}”未在示例文件名中找到：\n{name_no_ext}")
@@ -248,6 +383,9 @@ class App(tk.Tk):
         self.log_write(f"     示例提取ID：{name_no_ext[start:end]}\n")
 
     def group_by_slice(self):
+        if self._scan_q is not None:
+            messagebox.showwarning("提示", "正在扫描，请稍候。")
+            return
         if not self.scan_results:
             messagebox.showwarning("提示", "请先扫描 .nii.gz。")
             return
@@ -258,9 +396,9 @@ class App(tk.Tk):
             return
 
         self.group_map.clear()
+        group_map = self.group_map
         bad = 0
-        for p, _ in self.scan_results:
-            name_no_ext = p.name[:-7] if p.name.lower().endswith(".nii.gz") else p.stem
+        for p, _, name_no_ext in self.scan_results:
             if s >= len(name_no_ext):
                 bad += 1
                 continue
@@ -269,15 +407,16 @@ class App(tk.Tk):
             if not _id:
                 bad += 1
                 continue
-            self.group_map.setdefault(_id, []).append(p)
+            group_map[_id].append(p)
 
+        self._flat = [(_id, p) for _id, paths in sorted(self.group_map.items()) for p in sorted(paths)]
         self.log_write(f"[INFO] 分组完成：共 {len(self.group_map)} 个ID；无法提取的文件 {bad} 个。\n")
         self.preview_structure()
 
     def preview_structure(self):
         # 清空预览树
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self._preview_n = 0
+        self._refresh_viewport()
 
         dst_root = self.dst_dir.get().strip()
         if not dst_root:
@@ -287,20 +426,58 @@ class App(tk.Tk):
             self.log_write("[WARN] 暂无分组结果。请先设置切片并“提取并分组”。\n")
             return
 
-        # 预览插入：dst 与 ID 只在每组第一行展示
-        total = 0
-        for _id, paths in sorted(self.group_map.items()):
-            show_dst = str(Path(dst_root).resolve())
-            show_id = _id
-            for i, p in enumerate(sorted(paths)):
-                file_name = p.name
-                self.tree.insert("", tk.END,
-                                 values=(show_dst if i == 0 else "",
-                                         show_id if i == 0 else "",
-                                         file_name))
-                total += 1
+        # 预览：只渲染可见窗口，滚动时按 _flat 重建
+        self._preview_dst = str(Path(dst_root).resolve())
+        self._preview_n = total = len(self._flat)
+        self._view_first = 0
+        self._refresh_viewport()
         self.log_write(f"[OK] 预览完成：{len(self.group_map)} 个ID，共 {total} 个文件。\n")
 
+    def _visible_rows(self) -> int:
+        try:
+            rh = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError):
+            rh = 20
+        return max(1, (self.tree.winfo_height() - 24) // rh)  # 24 ≈ 表头高度
+
+    def _refresh_viewport(self):
+        """只插入 [first, first+window) 行；dst 与 ID 在每组第一行及窗口首行展示"""
+        total = self._preview_n
+        window = self._visible_rows()
+        first = max(0, min(self._view_first, total - window))
+        self._view_first = first
+        self.tree.delete(*self.tree.get_children())
+        last = min(first + window, total)
+        for i in range(first, last):
+            _id, p = self._flat[i]
+            head = i == first or self._flat[i - 1][0] != _id
+            self.tree.insert("", tk.END,
+                             values=(self._preview_dst if head else "",
+                                     _id if head else "",
+                                     os.path.basename(p)))
+        if total:
+            self._tree_scroll.set(first / total, last / total)
+        else:
+            self._tree_scroll.set(0, 1)
+
+    def _on_tree_scroll(self, *args):
+        if args[0] == "moveto":
+            self._view_first = int(float(args[1]) * self._preview_n)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self._view_first += step * (self._visible_rows() if args[2] == "pages" else 1)
+        self._refresh_viewport()
+
+    def _on_tree_wheel(self, event):
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self._on_tree_scroll("scroll", step, "units")
+        return "break"
+
     def start_execute(self):
         dst_root = self.dst_dir.get().strip()
         root = self.root_dir.get().strip()
@@ -313,6 +490,9 @@ class App(tk.Tk):
         if not self.group_map:
             messagebox.showwarning("提示", "请先完成分组并预览。")
             return
+        if self._scan_q is not None:
+            messagebox.showwarning("提示", "正在扫描，请稍候。")
+            return
         if not messagebox.askokcancel("确认", "确认开始复制吗？"):
             return
 
@@ -322,58 +502,90 @@ class App(tk.Tk):
     def _execute_copy(self):
         try:
             self._set_progress(0)
-            rootp = Path(self.root_dir.get().strip()).resolve()
-            dst_rootp = Path(self.dst_dir.get().strip()).resolve()
+            # 复制阶段全程使用 str 路径，避免逐文件构造 Path
+            root = os.path.realpath(self.root_dir.get().strip())
+            dst_root = os.path.realpath(self.dst_dir.get().strip())
             overwrite = self.overwrite.get()
+            # 本次执行内的目录内容缓存，供 ensure_unique 查重；覆盖模式下不查重，也就用不到
+            self._dir_contents_cache = {}
 
             # Step 0（可选）：先把“深层”文件统一拷贝到 root
             if self.flatten_deep.get():
-                deep_files = [(p, d) for p, d in self.scan_results if d]
+                deep_files = [(p, d) for p, d, _ in self.scan_results if d]
                 self.log_write(f"[STEP] 扁平化到 root：深层文件 {len(deep_files)} 个。\n")
                 done = 0
+                known = {p for p, _, _ in self.scan_results}
+                added = []
                 for p, _ in deep_files:
-                    dstp = rootp / p.name
-                    dstp = dstp if overwrite else ensure_unique(dstp)
-                    shutil.copy2(p, dstp)
+                    dstp = os.path.join(root, os.path.basename(p))
+                    dstp = dstp if overwrite else ensure_unique(dstp, self._dir_contents_cache)
+                    fast_copy(p, dstp)
+                    if dstp not in known:  # 覆盖已有 root 文件时不重复登记
+                        known.add(dstp)
+                        added.append((dstp, False, os.path.basename(dstp)[:-NII_SUFFIX_LEN]))
                     done += 1
                     if done % 10 == 0:
                         self._set_progress(5 + int(done * 5 / max(1, len(deep_files))))
                 self.log_write("[OK] 扁平化完成。\n")
-                # 扁平化后，建议重新以 root 扫描用于后续复制的“来源”
-                self.scan_results = walk_nii_gz(rootp)
+                # 扁平化后的“来源”= 原扫描结果 + 新拷到 root 的文件，直接在内存中更新，不再重新遍历磁盘
+                self.scan_results = self.scan_results + added
 
             # Step 1：按分组复制到 dst/ID/文件名
-            all_files = sum(len(v) for v in self.group_map.values())
+            # 目标文件名先在本线程按顺序确定（重名加 _1 / 覆盖模式同名只保留最后一个，与逐个复制的结果一致），
+            # 再交给线程池并发复制，避免两个线程写同一目标
+            tasks = {}
+            for _id, src in self._flat:  # 分组时已按 ID、路径排好序，无需再排
+                dstp = os.path.join(dst_root, _id, os.path.basename(src))
+                if not overwrite:
+                    dstp = ensure_unique(dstp, self._dir_contents_cache)
+                tasks[dstp] = src
+            all_files = len(tasks)
+            # 每个 ID 目录只建一次，而非每个文件一次 mkdir
+            for _id in self.group_map:
+                os.makedirs(os.path.join(dst_root, _id), exist_ok=True)
             self.log_write(f"[STEP] 开始复制：{len(self.group_map)} 个ID，共 {all_files} 个文件。\n")
             done = 0
-            for _id, paths in sorted(self.group_map.items()):
-                for src in sorted(paths):
-                    dstp = dst_rootp / _id / src.name
-                    copied_to = safe_copy_file(src, dstp, overwrite)
-                    self.log_write(f"[COPY] {src}  ->  {copied_to}\n")
-                    done += 1
-                    prog = 10 + int(done * 90 / max(1, all_files))
-                    self._set_progress(prog)
+            with ThreadPoolExecutor(max_workers=COPY_WORKERS) as ex:
+                futures = {ex.submit(safe_copy_file, src, dstp, overwrite): src for dstp, src in tasks.items()}
+                try:
+                    for fut in as_completed(futures):
+                        copied_to = fut.result()
+                        self.log_write(f"[COPY] {futures[fut]}  ->  {copied_to}\n")
+                        done += 1
+                        self._set_progress(10 + int(done * 90 / max(1, all_files)))
+                except Exception:
+                    for f in futures:
+                        f.cancel()  # 出错即中止，未开始的任务不再执行
+                    raise
 
             self._set_progress(100)
             self.log_write("[DONE] 全部复制完成。\n")
-            messagebox.showinfo("完成", "复制完成！")
+            self.after(0, messagebox.showinfo, "完成", "复制完成！")
         except Exception as e:
             self.log_write(f"[ERROR] {e}\n")
-            messagebox.showerror("错误", str(e))
+            self.after(0, messagebox.showerror, "错误", str(e))
 
-    # 日志 & 进度
+    # 日志 & 进度（log_write / _set_progress 任意线程可调用，不直接操作控件）
     def log_write(self, s: str):
-        self.log.insert(tk.END, s)
-        self.log.see(tk.END)
-        self.update_idletasks()
+        self._log_buf.append(s)
 
     def log_delete(self):
+        self._log_buf.clear()
         self.log.delete("1.0", tk.END)
 
     def _set_progress(self, v: int):
-        self.pg["value"] = max(0, min(100, v))
-        self.update_idletasks()
+        self._progress = max(0, min(100, v))
+
+    def _flush_ui(self):
+        if self._log_buf:
+            parts = []
+            while self._log_buf:
+                parts.append(self._log_buf.popleft())
+            self.log.insert(tk.END, "".join(parts))
+            self.log.see(tk.END)
+        if self.pg["value"] != self._progress:
+            self.pg["value"] = self._progress
+        self.after(100, self._flush_ui)
 
 if __name__ == "__main__":
     app = App()
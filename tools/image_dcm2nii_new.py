@@ -1,7 +1,14 @@
 import os
 import re
+import sys
+import queue
+import pickle
+import hashlib
+import shutil
 import threading
+import subprocess
 import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from collections import defaultdict, Counter
 from tkinter import *
 from tkinter import ttk, filedialog, messagebox
@@ -17,115 +24,273 @@ try:
 except Exception:
     sitk = None
 
+# 可选：系统中有 pigz 时，用多线程 gzip 压缩 .nii.gz（否则由 SimpleITK 单线程压缩）
+_PIGZ = shutil.which("pigz")
+
+# 可选：POSIX 平台上用 posix_fadvise 提前预读整个序列（Windows 无此接口，直接跳过）
+_FADVISE = getattr(os, "posix_fadvise", None)
+
+# 预编译的正则（natural_key 每次排序会被调用数百次）
+_SPLIT_DIGIT = re.compile(r'(\d+)')
+_SEQ_PREFIX = re.compile(r'^(\d+)-')
+_BAD_CHARS = re.compile(r'[\\/:*?"<>|]+')
+_WS = re.compile(r'\s+')
+
 
 def natural_key(s: str):
-    return [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', s)]
+    return [int(t) if t.isdigit() else t.lower() for t in _SPLIT_DIGIT.split(s)]
 
 
 def safe_join(*parts):
     return os.path.normpath(os.path.join(*parts))
 
 
+def _subdirs(path):
+    """path 下的子目录 (name, path)；类型取自目录项本身，普通条目无需额外 stat"""
+    with os.scandir(path) as it:
+        return [(e.name, e.path) for e in it if e.is_dir()]
+
+
 def find_ids(root):
     if not os.path.isdir(root):
         return []
-    return [d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d))]
+    return [name for name, _ in _subdirs(root)]
+
+
+DICOM_EXTS = ('.dcm', '.dicom')
+# 扫描时读取的示例元数据
+SCAN_META_KEYS = ["Modality", "SeriesDescription", "Series Description",
+                  "SeriesInstanceUID", "StudyDescription", "PatientID"]
+SCAN_WORKERS = 8  # 扫描线程数默认值；单块机械硬盘上线程过多反而加剧寻道，可在界面调小
+SCAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dcm2nii")  # 扫描结果的本地缓存
+SCAN_CACHE_VERSION = 1  # records 结构变化时递增，旧缓存自动作废
+CONVERT_WORKERS = min(os.cpu_count() or 1, 8)  # 转换进程数默认值；1 表示单进程读写流水线
+INODE_IN_DIRENT = os.name != "nt"  # 目录项自带 inode 的平台
+SORT_THREADS = 8  # 单进程内按 InstanceNumber 排序时并发读取文件头的线程数；多进程转换时按进程数均分
 
 
-def scan_dicom_structure(root):
+def read_header(path, keys=None):
     """
-    扫描 root/ID/scan/series 下的 .dcm/.dicom
-    输出 records（每条为一个可转换单元），stats（统计）
+    只解析头部：跳过像素，超过 1 KB 的元素延迟读取；
+    keys（DICOM keyword，可含空格）全部可识别时只读取这些标签，并在越过其中最大的标签后立即停止解析
+    （数据集按标签升序存放），否则读到像素数据之前的完整头部
+    """
+    tags = None
+    last_tag = 0x7FE00008  # 像素数据（含 Float / Double Float Pixel Data）之前停止
+    if keys:
+        nums = [pydicom.datadict.tag_for_keyword(k.replace(" ", "")) for k in keys]
+        if all(n is not None for n in nums):
+            last_tag = max(nums) + 1
+            # read_partial 不会像 dcmread 那样把 keyword 转成 Tag，必须直接传整数标签；
+            # 同时带上 SpecificCharacterSet，保证文本按正确字符集解码
+            tags = [pydicom.tag.Tag(n) for n in nums] + [pydicom.tag.Tag(0x00080005)]
+    with open(path, "rb") as fp:
+        ds = pydicom.filereader.read_partial(
+            fp, stop_when=lambda tag, VR, length: tag >= last_tag,
+            defer_size="1 KB", force=True, specific_tags=tags)
+    if tags and not any(t in ds for t in tags[:-1]):
+        # 部分读取一个请求的标签都没拿到：回退到完整头部读取，避免静默得到空数据集
+        ds = pydicom.dcmread(path, stop_before_pixels=True, force=True, defer_size="1 KB")
+    return ds
+
+
+def get_meta_value(ds, key):
+    """按 keyword / 原样 key 查找元数据，找不到返回 None"""
+    k1 = key.replace(" ", "")
+    if hasattr(ds, k1):
+        return getattr(ds, k1)
+    if key in ds:
+        return ds.get(key)
+    if k1 in ds:
+        return ds.get(k1)
+    return None
+
+
+def _scan_scan_dir(pid, scan, scan_dir):
+    """
+    扫描一个 root/ID/scan 目录下的全部 series（线程池中的单个任务）
+    返回 (records, series_folders, total_files)
     """
-    exts = {'.dcm', '.dicom'}
     records = []
     total_files = 0
     series_folders = 0
+    for series, series_dir in _subdirs(scan_dir):
+        with os.scandir(series_dir) as it:
+            # inode 取自目录项（POSIX 下随 readdir 一起返回，无需额外 stat），供 HDD 模式按磁盘布局顺序读取；
+            # Windows 上 DirEntry.inode() 每个文件要多一次 stat，故不收集
+            entries = [(e.path, e.inode() if INODE_IN_DIRENT else None) for e in it
+                       if e.name.lower().endswith(DICOM_EXTS) and e.is_file()]
+        if not entries:
+            continue
+        files = [p for p, _ in entries]
+        inode_of = dict(entries)
+
+        series_folders += 1
+        total_files += len(files)
+
+        # 以 ^(\d+)- 前缀拆分组；无此前缀的归到 'all'
+        groups = defaultdict(list)
+        for f in files:
+            base = os.path.basename(f)
+            m = _SEQ_PREFIX.match(base)
+            if m:
+                groups[m.group(1)].append(f)
+            else:
+                groups['all'].append(f)
+
+        for seq_label, flist in groups.items():
+            flist.sort(key=natural_key)
+            example_meta = {}
+            if pydicom and flist:
+                try:
+                    ds = read_header(flist[0], SCAN_META_KEYS)
+                    for k in SCAN_META_KEYS:
+                        val = get_meta_value(ds, k)
+                        if val is not None:
+                            example_meta[k] = str(val)
+                except Exception:
+                    example_meta = {"_meta_error": "failed to read metadata"}
+
+            records.append({
+                "id": pid,
+                "scan": scan,
+                "series": series,
+                "seq_label": seq_label,
+                "files": flist,
+                "example_meta": example_meta,
+                "meta_file": flist[0],  # example_meta 取自该文件，自定义命名时可复用
+                "inodes": [inode_of[f] for f in flist] if INODE_IN_DIRENT else None,  # 与 files 一一对应
+            })
+    return records, series_folders, total_files
+
+
+def _scan_cache_path(root):
+    key = hashlib.blake2b(os.path.realpath(root).encode("utf-8", "surrogateescape"), digest_size=16).hexdigest()
+    return os.path.join(SCAN_CACHE_DIR, f"scan_{key}.pkl")
+
+
+def load_scan_cache(root):
+    """读取 root 的扫描缓存 {pid: (signature, records, series_folders, total_files)}；不存在、损坏或版本不符时返回 {}"""
+    try:
+        with open(_scan_cache_path(root), "rb") as fp:
+            data = pickle.load(fp)
+        if data.get("version") == SCAN_CACHE_VERSION:
+            return data["ids"]
+    except Exception:
+        pass
+    return {}
+
+
+def save_scan_cache(root, id_entries):
+    path = _scan_cache_path(root)
+    tmp = path + ".tmp"
+    try:
+        os.makedirs(SCAN_CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as fp:
+            pickle.dump({"version": SCAN_CACHE_VERSION, "ids": id_entries}, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)  # 先写临时文件再替换，避免半截缓存
+    except OSError:
+        pass
+
+
+def _id_signature(id_dir):
+    """
+    ID 目录及其 scan / series 子目录的 mtime。
+    series 内增删文件只会改变 series 目录自身的 mtime，所以要下探到 series 一层，只 stat 目录、不列举文件
+    """
+    sig = [("", os.stat(id_dir).st_mtime_ns)]
+    for scan, scan_dir in _subdirs(id_dir):
+        sig.append((scan, os.stat(scan_dir).st_mtime_ns))
+        for series, series_dir in _subdirs(scan_dir):
+            sig.append((scan + "/" + series, os.stat(series_dir).st_mtime_ns))
+    sig.sort()
+    return tuple(sig)
+
+
+def scan_dicom_structure(root, workers=SCAN_WORKERS, use_cache=True):
+    """
+    扫描 root/ID/scan/series 下的 .dcm/.dicom
+    输出 records（每条为一个可转换单元），stats（统计）
+    各 scan 目录相互独立，交给线程池并发扫描（目录列举与头文件读取均为 I/O，等待时不占 GIL）
+    use_cache=True 时按 ID 复用磁盘缓存：目录 mtime 签名未变的 ID 直接取缓存，只重扫有变化的 ID
+    """
     ids = find_ids(root)
+    cache = load_scan_cache(root) if use_cache else {}
 
-    for pid in ids:
-        id_dir = safe_join(root, pid)
-        for scan in os.listdir(id_dir):
-            scan_dir = safe_join(id_dir, scan)
-            if not os.path.isdir(scan_dir):
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        sigs = dict(zip(ids, ex.map(lambda pid: _id_signature(safe_join(root, pid)), ids)))
+        fresh = {pid: cache[pid] for pid in ids if pid in cache and cache[pid][0] == sigs[pid]}
+
+        tasks = []
+        for pid in ids:
+            if pid in fresh:
                 continue
-            for series in os.listdir(scan_dir):
-                series_dir = safe_join(scan_dir, series)
-                if not os.path.isdir(series_dir):
-                    continue
+            for scan, scan_dir in _subdirs(safe_join(root, pid)):
+                tasks.append((pid, scan, scan_dir))
 
-                files = []
-                for fn in os.listdir(series_dir):
-                    p = safe_join(series_dir, fn)
-                    if os.path.isfile(p):
-                        _, ext = os.path.splitext(fn)
-                        if ext.lower() in exts:
-                            files.append(p)
-                if not files:
-                    continue
+        scanned = defaultdict(list)
+        # map 按提交顺序返回，记录顺序与串行扫描一致
+        for (pid, _, _), res in zip(tasks, ex.map(lambda t: _scan_scan_dir(*t), tasks)):
+            scanned[pid].append(res)
 
-                series_folders += 1
-                total_files += len(files)
-
-                # 以 ^(\d+)- 前缀拆分组；无此前缀的归到 'all'
-                groups = defaultdict(list)
-                for f in files:
-                    base = os.path.basename(f)
-                    m = re.match(r'^(\d+)-', base)
-                    if m:
-                        groups[m.group(1)].append(f)
-                    else:
-                        groups['all'].append(f)
-
-                for seq_label, flist in groups.items():
-                    flist.sort(key=natural_key)
-                    example_meta = {}
-                    if pydicom and flist:
-                        try:
-                            ds = pydicom.dcmread(flist[0], stop_before_pixels=True, force=True)
-                            for k in ["Modality", "SeriesDescription", "Series Description",
-                                      "SeriesInstanceUID", "StudyDescription", "PatientID"]:
-                                k1 = k.replace(" ", "")
-                                if hasattr(ds, k1):
-                                    example_meta[k] = str(getattr(ds, k1))
-                                elif k in ds:
-                                    example_meta[k] = str(ds.get(k, ""))
-                                elif k1 in ds:
-                                    example_meta[k] = str(ds.get(k1, ""))
-                        except Exception:
-                            example_meta = {"_meta_error": "failed to read metadata"}
-
-                    records.append({
-                        "id": pid,
-                        "scan": scan,
-                        "series": series,
-                        "seq_label": seq_label,
-                        "files": flist,
-                        "example_meta": example_meta
-                    })
+    id_entries = {}
+    records = []
+    total_files = 0
+    series_folders = 0
+    for pid in ids:
+        if pid in fresh:
+            entry = fresh[pid]
+        else:
+            recs, n_series, n_files = [], 0, 0
+            for r, s, n in scanned[pid]:
+                recs.extend(r)
+                n_series += s
+                n_files += n
+            entry = (sigs[pid], recs, n_series, n_files)
+        id_entries[pid] = entry
+        records.extend(entry[1])
+        series_folders += entry[2]
+        total_files += entry[3]
+
+    # 未装 pydicom 或读头失败（_meta_error）的结果不写入缓存，避免一次偶发错误在目录变化前一直被复用
+    if use_cache and pydicom and (len(fresh) != len(ids) or len(cache) != len(fresh)):
+        save_scan_cache(root, {pid: entry for pid, entry in id_entries.items()
+                               if not any("_meta_error" in r["example_meta"] for r in entry[1])})
 
     stats = {
         "num_ids": len(ids),
         "num_series_folders": series_folders,
         "num_dicom_files": total_files,
         "num_groups": len(records),
+        "num_cached_ids": len(fresh),
     }
     return records, stats
 
 
-def sort_by_instance_number(files):
+def sort_by_instance_number(files, inodes=None, threads=SORT_THREADS):
+    """
+    按 InstanceNumber 排序；给出 inodes（与 files 一一对应）时按 inode 顺序逐个读取各文件头，
+    机械硬盘上可大幅减少寻道，读完后仍按 InstanceNumber 排回切片顺序
+    """
     if not pydicom:
         return sorted(files, key=natural_key)
+    if inodes is not None and len(inodes) == len(files):
+        files = [f for _, f in sorted(zip(inodes, files))]
+        threads = 1  # 并发读取会把 inode 顺序重新打乱成随机寻道
 
-    items = []
-    for f in files:
-        inst = None
+    def instance_number(f):
         try:
-            ds = pydicom.dcmread(f, stop_before_pixels=True, force=True)
-            inst = int(getattr(ds, "InstanceNumber", None) or ds.get("InstanceNumber") or 0)
+            ds = read_header(f, ["InstanceNumber"])
+            return int(getattr(ds, "InstanceNumber", None) or ds.get("InstanceNumber") or 0)
         except Exception:
-            inst = None
-        items.append((f, inst))
+            return None
+
+    # 每个文件只解析 InstanceNumber 一个标签；各文件相互独立，用线程池重叠读盘等待
+    if threads <= 1:
+        items = [(f, instance_number(f)) for f in files]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            items = list(zip(files, ex.map(instance_number, files)))
 
     with_num = [(f, inst) for (f, inst) in items if isinstance(inst, int)]
     without_num = [f for (f, inst) in items if not isinstance(inst, int)]
@@ -136,60 +301,174 @@ def sort_by_instance_number(files):
     return [f for (f, _) in with_num] + without_num
 
 
+def gdcm_sort(files, series_uid):
+    """
+    交给 GDCM（C++）按空间位置排序，省去逐文件 Python 解析；
+    结果须恰好覆盖 files（同目录可能有别的序列组 / 非 .dcm 文件），否则返回 None 由调用方回退
+    """
+    if not sitk or not series_uid or not files:
+        return None
+    try:
+        ordered = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(os.path.dirname(files[0]), series_uid)
+    except Exception:
+        return None
+    wanted = {os.path.normcase(os.path.normpath(f)) for f in files}
+    ordered = [f for f in ordered if os.path.normcase(os.path.normpath(f)) in wanted]
+    return ordered if len(ordered) == len(files) else None
+
+
+def prefetch_files(files):
+    """提示内核把各文件异步读入页缓存（POSIX_FADV_WILLNEED），之后 GDCM 逐个读取时直接命中缓存"""
+    if _FADVISE is None:
+        return
+    for f in files:
+        try:
+            fd = os.open(f, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            _FADVISE(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
 def read_series_to_image(file_list):
     if not sitk:
         raise RuntimeError("SimpleITK 未安装，无法进行图像转换。")
+    prefetch_files(file_list)
     reader = sitk.ImageSeriesReader()
     reader.SetFileNames(file_list)
+    # 输出只用像素与几何信息，不需要逐切片的元数据字典：关掉可省去对每个头部的再一次完整解析
+    reader.MetaDataDictionaryArrayUpdateOff()
+    reader.LoadPrivateTagsOff()
     img = reader.Execute()
     return img
 
 
-def ensure_unique_path(path):
-    """若存在同名，则添加 _2, _3 …；兼容 .nii.gz 双扩展"""
-    if not os.path.exists(path):
-        return path
-    base, ext = os.path.splitext(path)
-    if base.endswith(".nii"):
-        root = base[:-4]
-        ext = ".nii.gz"
-        idx = 2
-        candidate = f"{root}_{idx}{ext}"
-        while os.path.exists(candidate):
-            idx += 1
-            candidate = f"{root}_{idx}{ext}"
-        return candidate
+def write_nifti(img, out_path, level=1, pigz_threads=None):
+    """
+    写出 NIfTI：level=0 时不压缩（out_path 应为 .nii）；
+    1~9 为 gzip 级别，有 pigz 时先写 .nii 再交给 pigz 多线程压缩，失败则回退 SimpleITK 自带压缩。
+    pigz_threads 为 None 时 pigz 使用全部核；多进程转换时应按进程数均分
+    """
+    if level <= 0:
+        sitk.WriteImage(img, out_path, useCompression=False)
+        return
+    if _PIGZ and out_path.lower().endswith(".nii.gz"):
+        tmp = f"{out_path[:-7]}.{os.getpid()}.{threading.get_ident()}.tmp.nii"
+        try:
+            sitk.WriteImage(img, tmp, useCompression=False)
+            cmd = [_PIGZ, "-f", f"-{level}"]
+            if pigz_threads:
+                cmd += ["-p", str(pigz_threads)]
+            subprocess.run(cmd + [tmp], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            os.replace(tmp + ".gz", out_path)
+            return
+        except (OSError, subprocess.CalledProcessError):
+            pass  # pigz 不可用或失败：回退到下面的 SimpleITK 压缩写出
+        finally:
+            # 任何异常（含 SimpleITK 写临时文件时的 RuntimeError）都不在输出目录留下临时文件
+            for p in (tmp, tmp + ".gz"):
+                if os.path.exists(p):
+                    os.remove(p)
+    try:
+        sitk.WriteImage(img, out_path, useCompression=True, compressionLevel=level)
+    except TypeError:  # SimpleITK < 2.0 不支持 compressionLevel
+        sitk.WriteImage(img, out_path, useCompression=True)
+
+
+def load_record(rec, mode, meta_keys, use_gdcm_sort=True, level=1, hdd_mode=False,
+                read_threads=SORT_THREADS):
+    """读入一个 record：排序切片、读成图像并确定输出文件名，返回 (img, out_name)"""
+    files = rec["files"]
+    files_sorted = None
+    if use_gdcm_sort:
+        files_sorted = gdcm_sort(files, rec["example_meta"].get("SeriesInstanceUID"))
+    if files_sorted is None:
+        if hdd_mode:  # 没有 inode（Windows）时按自然顺序，但同样逐个读取
+            files_sorted = sort_by_instance_number(files, rec.get("inodes"), 1)
+        else:
+            files_sorted = sort_by_instance_number(files, None, read_threads)
+    img = read_series_to_image(files_sorted)
+
+    if mode == "default":
+        out_name = make_output_name_default(rec["scan"], rec["series"])
+    else:
+        cached = None
+        if rec.get("meta_file") == files_sorted[0] and "_meta_error" not in rec["example_meta"]:
+            cached = rec["example_meta"]
+        out_name = make_output_name_custom(files_sorted[0], meta_keys, cached)
+    if level == 0:
+        out_name = out_name[:-3]  # .nii.gz -> .nii
+    return img, out_name
+
+
+def _convert_one(rec, dst_root, mode, meta_keys, use_gdcm_sort=True, level=1, hdd_mode=False, tag="0",
+                 read_threads=1, pigz_threads=1):
+    """
+    进程池任务（须为顶层函数以便 pickle）：转换一个 record，写到 dst/ID 下的临时文件，返回 (out_name, tmp_path)。
+    各进程互不共享状态，最终文件名由主进程统一去重后改名
+    """
+    img, out_name = load_record(rec, mode, meta_keys, use_gdcm_sort, level, hdd_mode, read_threads)
+    out_dir = safe_join(dst_root, rec["id"])
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, f".tmp_{tag}" + (".nii" if level == 0 else ".nii.gz"))
+    try:
+        write_nifti(img, tmp_path, level, pigz_threads)
+    except BaseException:
+        if os.path.exists(tmp_path):  # 写出失败时不在 dst/ID 下留下半截临时文件
+            os.remove(tmp_path)
+        raise
+    return out_name, tmp_path
+
+
+def name_key(name):
+    """重名判断用的键：Windows 由 normcase 处理；macOS 默认的 APFS / HFS+ 不区分大小写，而 normcase 在 macOS 上不转小写"""
+    key = os.path.normcase(name)
+    return key.lower() if sys.platform == "darwin" else key
+
+
+def reserve_unique_name(name, used):
+    """
+    若同名已被占用，则添加 _2, _3 …；兼容 .nii.gz 双扩展。
+    used 为该输出目录已有及已分配文件名（name_key）的集合，选定的名字会登记回去，循环内无文件系统调用
+    """
+    if name.endswith(".nii.gz"):
+        root, ext = name[:-7], ".nii.gz"
+    else:
+        root, ext = os.path.splitext(name)
+    candidate = name
     idx = 2
-    candidate = f"{base}_{idx}{ext}"
-    while os.path.exists(candidate):
+    while name_key(candidate) in used:
+        candidate = f"{root}_{idx}{ext}"
         idx += 1
-        candidate = f"{base}_{idx}{ext}"
+    used.add(name_key(candidate))
     return candidate
 
 
 def make_output_name_default(scan, series):
     name = f"{scan}_{series}.nii.gz"
-    return re.sub(r'[\\/:*?"<>|]+', "_", name)
-
-
-def make_output_name_custom(first_file, meta_keys):
-    if not pydicom:
-        raise RuntimeError("pydicom 未安装，无法使用自定义命名。")
-    ds = pydicom.dcmread(first_file, stop_before_pixels=True, force=True)
+    return _BAD_CHARS.sub("_", name)
+
+
+def make_output_name_custom(first_file, meta_keys, cached_meta=None):
+    """cached_meta：扫描时从 first_file 读到的 {key: str}；meta_keys 均在扫描范围内时直接复用，不再读文件"""
+    if cached_meta is not None and all(k in SCAN_META_KEYS for k in meta_keys):
+        lookup = cached_meta.get
+    else:
+        if not pydicom:
+            raise RuntimeError("pydicom 未安装，无法使用自定义命名。")
+        ds = read_header(first_file, meta_keys)
+        lookup = lambda key: get_meta_value(ds, key)
     values = []
     for key in meta_keys:
-        k1 = key.replace(" ", "")
-        val = None
-        if hasattr(ds, k1):
-            val = getattr(ds, k1)
-        elif key in ds:
-            val = ds.get(key)
-        elif k1 in ds:
-            val = ds.get(k1)
+        val = lookup(key)
         if val is None:
             val = "NULL"
-        sval = re.sub(r'\s+', ' ', str(val)).strip()
-        sval = re.sub(r'[\\/:*?"<>|]+', "_", sval)
+        sval = _WS.sub(' ', str(val)).strip()
+        sval = _BAD_CHARS.sub("_", sval)
         values.append(sval if sval else "NULL")
     joined = "_".join(values) if values else "unnamed"
     return f"{joined}.nii.gz"
@@ -204,14 +483,24 @@ class Dcm2NiiGUI:
         self.dst_dir = StringVar()
 
         self.naming_mode = StringVar(value="default")
+        self.scan_workers = IntVar(value=SCAN_WORKERS)
+        self.use_scan_cache = BooleanVar(value=True)
+        self.use_gdcm_sort = BooleanVar(value=True)
+        self.hdd_mode = BooleanVar(value=False)  # 机械硬盘：按 inode 顺序读取切片；SSD 上保持自然顺序
+        self.compress_level = IntVar(value=1)  # 0=不压缩写 .nii；1~9 为 gzip 级别（1 最快）
+        self.convert_workers = IntVar(value=CONVERT_WORKERS)
         self.meta_keys = []
 
         self.records = []
         self.stats = {}
 
         self._stop_flag = threading.Event()
+        # 日志队列：工作线程只入队，由主线程定时批量写入 Text
+        self._log_q = queue.Queue()
+        self._scanning = False
 
         self.build_ui()
+        self.master.after(100, self._drain_log)
 
     def build_ui(self):
         frm_top = ttk.Frame(self.master, padding=8)
@@ -230,7 +519,14 @@ class Dcm2NiiGUI:
         # 预览
         frm_preview = ttk.Frame(self.master, padding=8)
         frm_preview.pack(fill=BOTH, expand=True)
-        ttk.Button(frm_preview, text="扫描并预览", command=self.on_preview).pack(anchor=W)
+        frm_scan = ttk.Frame(frm_preview)
+        frm_scan.pack(fill=X)
+        ttk.Button(frm_scan, text="扫描并预览", command=self.on_preview).pack(side=LEFT)
+        ttk.Label(frm_scan, text="  扫描线程数：").pack(side=LEFT)
+        ttk.Spinbox(frm_scan, from_=1, to=64, textvariable=self.scan_workers, width=5).pack(side=LEFT)
+        ttk.Label(frm_scan, text="（机械硬盘建议 1~2）", foreground="#666").pack(side=LEFT)
+        ttk.Checkbutton(frm_scan, text="使用扫描缓存（目录未变的 ID 不重扫）",
+                        variable=self.use_scan_cache).pack(side=LEFT, padx=12)
 
         columns = ("id", "scan", "series", "seq", "num", "meta")
         self.tree = ttk.Treeview(frm_preview, columns=columns, show="headings", height=10)
@@ -265,6 +561,14 @@ class Dcm2NiiGUI:
         btns.pack(fill=X)
         ttk.Button(btns, text="开始转换", command=self.on_convert).pack(side=LEFT)
         ttk.Button(btns, text="停止", command=self.on_stop).pack(side=LEFT, padx=6)
+        ttk.Checkbutton(btns, text="用 GDCM 排序切片（失败时回退按 InstanceNumber）",
+                        variable=self.use_gdcm_sort).pack(side=LEFT, padx=12)
+        ttk.Checkbutton(btns, text="HDD 模式（按 inode 顺序读取）",
+                        variable=self.hdd_mode).pack(side=LEFT, padx=(0, 12))
+        ttk.Label(btns, text="压缩级别（0=不压缩）：").pack(side=LEFT)
+        ttk.Spinbox(btns, from_=0, to=9, textvariable=self.compress_level, width=4).pack(side=LEFT)
+        ttk.Label(btns, text="  转换进程数（1=单进程）：").pack(side=LEFT)
+        ttk.Spinbox(btns, from_=1, to=64, textvariable=self.convert_workers, width=4).pack(side=LEFT)
 
         # 日志
         frm_log = ttk.LabelFrame(self.master, text="日志", padding=8)
@@ -302,47 +606,103 @@ class Dcm2NiiGUI:
         self.meta_keys.clear()
 
     def log(self, msg):
-        self.txt_log.insert(END, msg + "\n")
-        self.txt_log.see(END)
-        self.master.update_idletasks()
+        self._log_q.put(msg)
+
+    def _drain_log(self):
+        batch = []
+        try:
+            while len(batch) < 200:
+                batch.append(self._log_q.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self.txt_log.insert(END, "\n".join(batch) + "\n")
+            self.txt_log.see(END)
+        self.master.after(100, self._drain_log)
+
+    def clear_log(self):
+        try:
+            while True:
+                self._log_q.get_nowait()
+        except queue.Empty:
+            pass
+        self.txt_log.delete("1.0", END)
+
+    def _set_progress(self, value, maximum=None):
+        if maximum is not None:
+            self.pb["maximum"] = maximum
+        self.pb["value"] = value
 
     def on_preview(self):
         root = self.root_dir.get().strip()
         if not root or not os.path.isdir(root):
             messagebox.showerror("错误", "请先选择有效的 root 目录。")
             return
+        if self._scanning:
+            return
+        try:
+            workers = max(1, int(self.scan_workers.get()))
+        except (TclError, ValueError):
+            workers = SCAN_WORKERS
+        self._scanning = True
         self.tree.delete(*self.tree.get_children())
-        self.txt_log.delete("1.0", END)
+        self.clear_log()
         self.log("[INFO] 开始扫描 ...")
+        # 扫描与 DICOM 头读取放到子线程，主线程只负责动画与结果展示
+        self.pb.configure(mode="indeterminate")
+        self.pb.start(15)
+        t = threading.Thread(target=self._do_preview_thread,
+                             args=(root, workers, self.use_scan_cache.get()), daemon=True)
+        t.start()
+
+    def _do_preview_thread(self, root, workers, use_cache=True):
         try:
-            records, stats = scan_dicom_structure(root)
-            self.records = records
-            self.stats = stats
-            for rec in records:
-                meta_summary = ""
-                if rec["example_meta"]:
-                    pairs = list(rec["example_meta"].items())[:3]
-                    meta_summary = "; ".join([f"{k}: {v}" for k, v in pairs])
-                self.tree.insert("", END, values=(
-                    rec["id"], rec["scan"], rec["series"],
-                    rec["seq_label"], len(rec["files"]), meta_summary
-                ))
-            stat_msg = (f"IDs: {stats['num_ids']} | Series folders: {stats['num_series_folders']} | "
-                        f"DICOM files: {stats['num_dicom_files']} | Sequence groups: {stats['num_groups']}")
-            self.stats_var.set(stat_msg)
-            self.log("[INFO] 扫描完成。")
-            self.log("[INFO] " + stat_msg)
-            self.pb["maximum"] = len(self.records)
-            self.pb["value"] = 0
+            records, stats = scan_dicom_structure(root, workers, use_cache)
         except Exception:
             self.log("[ERROR] 扫描失败：\n" + traceback.format_exc())
+            self.master.after(0, self._show_preview, None, None)
+            return
+        self.master.after(0, self._show_preview, records, stats)
+
+    def _show_preview(self, records, stats):
+        self._scanning = False
+        self.pb.stop()
+        self.pb.configure(mode="determinate")
+        if records is None:
+            self._set_progress(0)
             messagebox.showerror("错误", "扫描失败，请查看日志。")
+            return
+        self.records = records
+        self.stats = stats
+        rows = []
+        for rec in records:
+            meta_summary = ""
+            if rec["example_meta"]:
+                pairs = list(rec["example_meta"].items())[:3]
+                meta_summary = "; ".join([f"{k}: {v}" for k, v in pairs])
+            rows.append((rec["id"], rec["scan"], rec["series"],
+                         rec["seq_label"], len(rec["files"]), meta_summary))
+        # Tk 本身会把重绘推迟到空闲时，这里只需紧凑地连续插入
+        insert = self.tree.insert
+        for values in rows:
+            insert("", END, values=values)
+        stat_msg = (f"IDs: {stats['num_ids']} | Series folders: {stats['num_series_folders']} | "
+                    f"DICOM files: {stats['num_dicom_files']} | Sequence groups: {stats['num_groups']}")
+        self.stats_var.set(stat_msg)
+        self.log("[INFO] 扫描完成。")
+        if stats.get("num_cached_ids"):
+            self.log(f"[INFO] {stats['num_cached_ids']} 个 ID 目录未变化，直接使用扫描缓存。")
+        self.log("[INFO] " + stat_msg)
+        self._set_progress(0, len(self.records))
 
     def on_stop(self):
         self._stop_flag.set()
         self.log("[INFO] 已请求停止。")
 
     def on_convert(self):
+        if self._scanning:
+            messagebox.showwarning("提示", "正在扫描，请稍候。")
+            return
         if not self.records:
             messagebox.showwarning("提示", "请先扫描并预览。")
             return
@@ -360,7 +720,7 @@ class Dcm2NiiGUI:
             return
 
         self._stop_flag.clear()
-        self.txt_log.delete("1.0", END)
+        self.clear_log()
         t = threading.Thread(target=self._do_convert_thread, daemon=True)
         t.start()
 
@@ -368,52 +728,134 @@ class Dcm2NiiGUI:
         mode = self.naming_mode.get()
         meta_keys = [sv.get().strip() for sv in self.meta_keys]
         dst_root = self.dst_dir.get().strip()
+        use_gdcm_sort = self.use_gdcm_sort.get()
+        hdd_mode = self.hdd_mode.get()
+        try:
+            level = min(9, max(0, int(self.compress_level.get())))
+        except (TclError, ValueError):
+            level = 1
+        try:
+            workers = max(1, int(self.convert_workers.get()))
+        except (TclError, ValueError):
+            workers = CONVERT_WORKERS
 
         id_counter = Counter()
-        self.pb["maximum"] = len(self.records)
-        self.pb["value"] = 0
-        self.log("[INFO] 开始转换 ...")
+        records = list(self.records)
+        opts = (dst_root, mode, meta_keys, use_gdcm_sort, level, hdd_mode)
+        self.master.after(0, self._set_progress, 0, len(records))
+        self.log(f"[INFO] 开始转换（{workers} 个进程）...")
+
+        # 每个要写入的 dst/ID 目录只 listdir 一次，之后的重名判断都在内存中完成
+        self._used_names = defaultdict(set)
+        for pid in {rec["id"] for rec in records}:
+            out_dir = safe_join(dst_root, pid)
+            try:
+                self._used_names[out_dir] = {name_key(n) for n in os.listdir(out_dir)}
+            except OSError:
+                pass
 
-        for idx, rec in enumerate(self.records, 1):
-            if self._stop_flag.is_set():
-                self.log("[INFO] 已停止。")
+        if workers > 1:
+            self._convert_pool(records, opts, workers, id_counter)
+        else:
+            self._convert_pipeline(records, opts, id_counter)
+
+        if not self._stop_flag.is_set():
+            self.log("[INFO] 转换完成。")
+            summary = " | ".join([f"{k}:{v}" for k, v in id_counter.items()])
+            if summary:
+                self.log("[SUMMARY] 每个ID的输出数量： " + summary)
+            self.master.after(0, messagebox.showinfo, "完成", "全部转换完成。")
+
+    def _convert_pool(self, records, opts, workers, id_counter):
+        """多进程转换：各 record 相互独立，每个进程完整地读入、压缩并写出临时文件，主进程去重改名"""
+        done = 0
+        stopped = False
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            # 各进程平分读文件头的线程，避免 进程数 × SORT_THREADS 个读取同时争抢磁盘
+            read_threads = max(1, SORT_THREADS // workers)
+            # pigz 同理：每个进程只用 核数 / 进程数 个压缩线程，避免 CPU 超额订阅
+            pigz_threads = max(1, (os.cpu_count() or 1) // workers)
+            futs = {ex.submit(_convert_one, rec, *opts, f"{os.getpid()}_{i}", read_threads, pigz_threads): rec
+                    for i, rec in enumerate(records, 1)}
+            for fut in as_completed(futs):
+                if self._stop_flag.is_set() and not stopped:
+                    # 取消尚未开始的任务；已在运行的任务照常收尾
+                    stopped = True
+                    for other in futs:
+                        other.cancel()
+                    self.log("[INFO] 已停止。")
+                done += 1
+                if fut.cancelled():
+                    continue
+                rec = futs[fut]
+                try:
+                    out_name, tmp_path = fut.result()
+                    out_dir = os.path.dirname(tmp_path)
+                    out_path = os.path.join(out_dir, reserve_unique_name(out_name, self._used_names[out_dir]))
+                    os.replace(tmp_path, out_path)
+
+                    id_counter[rec["id"]] += 1
+                    self.log(f"[OK] {rec['id']} | {rec['scan']}/{rec['series']} ({rec['seq_label']}) -> {out_path}")
+                except Exception:
+                    self.log("[ERROR] 转换失败：\n" + traceback.format_exc())
+                finally:
+                    if done & 15 == 0 or done == len(records):  # 每 16 条刷新一次进度条
+                        self.master.after(0, self._set_progress, done)
+
+    def _convert_pipeline(self, records, opts, id_counter):
+        dst_root, mode, meta_keys, use_gdcm_sort, level, hdd_mode = opts
+
+        # 读取 / 写出两级流水线：读取线程读 DICOM，本线程压缩写出，磁盘读取与 zlib 计算相互重叠。
+        # 队列最多缓存 2 个已读入的体数据，峰值内存约为 3 个体数据
+        pipe = queue.Queue(maxsize=2)
+
+        def reader():
+            for idx, rec in enumerate(records, 1):
+                if self._stop_flag.is_set():
+                    break
+                try:
+                    img, out_name = load_record(rec, mode, meta_keys, use_gdcm_sort, level, hdd_mode)
+                    pipe.put((idx, rec, img, out_name, None))
+                except Exception:
+                    pipe.put((idx, rec, None, None, traceback.format_exc()))
+            pipe.put(None)
+
+        threading.Thread(target=reader, daemon=True).start()
+
+        stopped = False
+        while True:
+            item = pipe.get()
+            if item is None:
                 break
+            if self._stop_flag.is_set():
+                # 停止后继续取空队列（丢弃），读取线程才不会阻塞在 put 上
+                if not stopped:
+                    self.log("[INFO] 已停止。")
+                    stopped = True
+                continue
+            idx, rec, img, out_name, err = item
             try:
+                if err:
+                    self.log("[ERROR] 转换失败：\n" + err)
+                    continue
                 pid = rec["id"]
-                scan = rec["scan"]
-                series = rec["series"]
-                files = rec["files"]
-
-                files_sorted = sort_by_instance_number(files)
-                img = read_series_to_image(files_sorted)
 
                 # ====== 仅创建 dst/ID 文件夹（不复制 root 中的 scan/series 结构）======
                 out_dir = safe_join(dst_root, pid)   # 只有 ID 层级
                 os.makedirs(out_dir, exist_ok=True)
                 # ============================================================
 
-                if mode == "default":
-                    out_name = make_output_name_default(scan, series)
-                else:
-                    out_name = make_output_name_custom(files_sorted[0], meta_keys)
-
-                out_path = ensure_unique_path(safe_join(out_dir, out_name))
-                sitk.WriteImage(img, out_path, useCompression=True)
+                out_path = os.path.join(out_dir, reserve_unique_name(out_name, self._used_names[out_dir]))
+                write_nifti(img, out_path, level)
 
                 id_counter[pid] += 1
-                self.log(f"[OK] {pid} | {scan}/{series} ({rec['seq_label']}) -> {out_path}")
+                self.log(f"[OK] {pid} | {rec['scan']}/{rec['series']} ({rec['seq_label']}) -> {out_path}")
             except Exception:
                 self.log("[ERROR] 转换失败：\n" + traceback.format_exc())
             finally:
-                self.pb["value"] = idx
-                self.master.update_idletasks()
-
-        if not self._stop_flag.is_set():
-            self.log("[INFO] 转换完成。")
-            summary = " | ".join([f"{k}:{v}" for k, v in id_counter.items()])
-            if summary:
-                self.log("[SUMMARY] 每个ID的输出数量： " + summary)
-            messagebox.showinfo("完成", "全部转换完成。")
+                img = None  # 尽早释放体数据
+                if idx & 15 == 0 or idx == len(records):  # 每 16 条刷新一次进度条
+                    self.master.after(0, self._set_progress, idx)
 
 
 if __name__ == "__main__":
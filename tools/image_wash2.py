@@ -3,7 +3,13 @@
 import os
 import sys
 import re
+import errno
+import queue
 import shutil
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
@@ -18,6 +24,15 @@ try:
 except Exception:
     _sitk = None
 
+LOG_MAX_LINES = 5000  # 日志框最多保留的行数
+
+# 可选：系统中有 pigz 时，用多线程 gzip 压缩 .nii.gz（否则由 SimpleITK 单线程压缩）
+_PIGZ = shutil.which("pigz")
+
+# 单文件容器格式：同格式时可直接按字节复制 / 移动。
+# .mhd / .hdr / .nhdr 等头文件另有数据文件，只复制头文件会指向旧数据，须解码后重新写出
+SINGLE_FILE_EXTS = {".nii", ".nii.gz", ".mha", ".nrrd"}
+
 
 # ------------------------------
 # 工具函数：复合扩展名处理（.nii.gz）
@@ -26,10 +41,9 @@ def split_compound_ext(filename: str):
     """
     返回 (dirpath, basename_without_ext, ext) ，其中 ext 保留 .nii.gz 等复合后缀
     """
-    dirpath = os.path.dirname(filename)
-    base = os.path.basename(filename)
-    # 优先匹配 .nii.gz
-    if base.lower().endswith(".nii.gz"):
+    dirpath, base = os.path.split(filename)
+    # 优先匹配 .nii.gz（只对末 7 个字符做小写比较，不复制整个文件名）
+    if base[-7:].lower() == ".nii.gz":
         name = base[:-7]
         ext = ".nii.gz"
     else:
@@ -37,12 +51,6 @@ def split_compound_ext(filename: str):
     return dirpath, name, ext
 
 
-def has_allowed_ext(filepath: str, allowed_exts_set):
-    # 与 split_compound_ext 配套：优先识别 .nii.gz
-    _dir, _name, ext = split_compound_ext(filepath)
-    return ext.lower() in allowed_exts_set
-
-
 def norm_ext_list(ext_text: str):
     """
     ".nii,.nii.gz,.mha" → set{".nii",".nii.gz",".mha"}
@@ -58,6 +66,200 @@ def norm_ext_list(ext_text: str):
     return norm
 
 
+def norm_new_ext(ext_text: str):
+    """
+    " nii.gz " → ".nii.gz"；空串保持为空（表示不改扩展名）
+    """
+    e = ext_text.strip()
+    if e and not e.startswith("."):
+        e = "." + e
+    return e
+
+
+# ------------------------------
+# 工具函数：文件名规则（替换 → 删除 → 增加）
+# ------------------------------
+def compile_replace_rules(repl_pairs):
+    """
+    把 [(old, new), ...] 预编译为单个替换函数，整批文件复用
+    全部是互不串联的单字符替换时，用 str.translate 一趟完成；
+    否则保持原语义：按顺序逐对 str.replace（后一对作用于前一对的结果）
+    """
+    if not repl_pairs:
+        return None
+    olds = [o for o, _ in repl_pairs]
+    single_char = all(len(o) == 1 and len(n) <= 1 for o, n in repl_pairs)
+    chained = any(n in olds for _, n in repl_pairs if n)
+    if single_char and not chained and len(set(olds)) == len(olds):
+        table = str.maketrans(dict(repl_pairs))
+        return lambda s: s.translate(table)
+    pairs = tuple(repl_pairs)
+
+    def _replace(s):
+        for old, new in pairs:
+            s = s.replace(old, new)
+        return s
+    return _replace
+
+
+def apply_rename_rules(name: str, replace_fn=None, delete=None, insert=None):
+    """
+    对不含扩展名的文件名依次执行：替换 → 删除 → 增加
+    replace_fn：compile_replace_rules 的结果；delete=(start, length)；insert=(pos, token)，pos<0 表示从末尾数
+    """
+    if replace_fn is not None:
+        name = replace_fn(name)
+    if delete is not None:
+        start, length = delete
+        name = name[:start] + name[start + length:]
+    if insert is not None:
+        pos, token = insert
+        idx = len(name) + pos if pos < 0 else pos
+        idx = max(0, min(len(name), idx))
+        name = name[:idx] + token + name[idx:]
+    return name
+
+
+def iter_files(root: str, ext_tuple):
+    """
+    基于 os.scandir 的显式栈遍历，逐个产出后缀命中 ext_tuple 的文件路径
+    DirEntry 的 is_dir/is_file 复用目录读取时的类型信息，无需逐项 stat
+    """
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue  # 与 os.walk 一致：无权限/已删除的目录直接跳过
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file() and e.name.lower().endswith(ext_tuple):
+                        yield os.path.normpath(e.path)
+                except OSError:
+                    continue
+
+
+def detect_conflicts(pairs):
+    """
+    返回目标已存在（且不是源文件自身）的 (src, dst) 列表
+    按目标父目录分组，每个目录只 scandir 一次，之后在内存里判断
+    """
+    by_parent = {}
+    for src, dst in pairs:
+        by_parent.setdefault(os.path.dirname(dst), []).append((src, dst))
+    conflicts = []
+    for parent, items in by_parent.items():
+        try:
+            with os.scandir(parent) as it:
+                existing = {os.path.normcase(e.name) for e in it}
+        except OSError:
+            continue  # 目录尚不存在，不会冲突
+        for src, dst in items:
+            if (os.path.normcase(os.path.basename(dst)) in existing
+                    and os.path.normcase(dst) != os.path.normcase(src)):
+                conflicts.append((src, dst))
+    return conflicts
+
+
+def move_file(src: str, dst: str):
+    """
+    同一文件系统内用 os.replace 原子改名（不复制数据）；跨设备时退回 shutil.move
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
+
+# ------------------------------
+# 真正格式转换（在子进程中执行）
+# ------------------------------
+_io_objs = None  # 每个工作进程复用同一组 (ImageFileReader, ImageFileWriter)
+
+
+def _get_io():
+    global _io_objs
+    if _io_objs is None:
+        _io_objs = (_sitk.ImageFileReader(), _sitk.ImageFileWriter())
+    return _io_objs
+
+
+def use_compression_for(dst: str, compress_other: bool) -> bool:
+    """
+    按目标后缀决定 useCompression：.nii.gz 始终压缩；.mha/.mhd/.nrrd 由界面开关决定；.nii 等不压缩
+    """
+    low = dst.lower()
+    if low.endswith(".nii.gz"):
+        return True
+    return compress_other and low.endswith((".mha", ".mhd", ".nrrd"))
+
+
+def write_image(img, dst: str, pigz_threads: int = 1, writer=None, compress_other: bool = False):
+    """
+    写出图像；目标为 .nii.gz 且可用 pigz 时，先写未压缩 .nii 再交给 pigz 多线程压缩
+    pigz 失败则回退到 SimpleITK 自带的压缩写出
+    """
+    if writer is None:
+        writer = _sitk.ImageFileWriter()
+    if _PIGZ and dst[-7:].lower() == ".nii.gz":
+        writer.UseCompressionOff()
+        tmp = f"{dst[:-7]}.{os.getpid()}.tmp.nii"
+        try:
+            writer.SetFileName(tmp)
+            writer.Execute(img)
+            subprocess.run([_PIGZ, "-f", "-p", str(pigz_threads), tmp],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            os.replace(tmp + ".gz", dst)
+            return
+        except (OSError, subprocess.CalledProcessError):
+            pass  # pigz 不可用或失败：回退到下面的 SimpleITK 压缩写出
+        finally:
+            # 任何异常（含 SimpleITK 写临时文件时的 RuntimeError）都不在输出目录留下临时文件
+            for p in (tmp, tmp + ".gz"):
+                if os.path.exists(p):
+                    os.remove(p)
+    writer.SetUseCompression(use_compression_for(dst, compress_other))
+    writer.SetFileName(dst)
+    writer.Execute(img)
+
+
+def _convert_worker(src: str, dst: str, delete_src: bool, pigz_threads: int = 1,
+                    compress_other: bool = False):
+    """
+    读取 src 并按 dst 的后缀写出；返回 (方式 "convert"/"copy"/"move", 删除源失败信息或 None)
+    读写失败直接抛出，由主进程在 future.result() 处记录
+    """
+    reader, writer = _get_io()
+    reader.SetFileName(src)
+    src_ext = split_compound_ext(src)[2].lower()
+    if src_ext in SINGLE_FILE_EXTS and src_ext == split_compound_ext(dst)[2].lower():
+        # 同一容器格式：解码再编码不会改变像素内容，只读头信息确认可读，然后按字节处理
+        reader.ReadImageInformation()
+        if delete_src:
+            # 需要删除源文件时，直接移动即可，省去整份复制
+            move_file(src, dst)
+            return "move", None
+        shutil.copyfile(src, dst)
+        mode = "copy"
+    else:
+        img = reader.Execute()
+        write_image(img, dst, pigz_threads, writer, compress_other)
+        mode = "convert"
+    del_err = None
+    if delete_src:
+        try:
+            os.remove(src)
+        except Exception as e:
+            del_err = str(e)
+    return mode, del_err
+
+
 # ------------------------------
 # 可复用滚动容器
 # ------------------------------
@@ -118,6 +320,9 @@ class RenameApp(tk.Tk):
         self.root_dir = tk.StringVar()
         self.ext_text = tk.StringVar(value=".nii,.nii.gz,.mha,.nrrd")
         self.all_files = []            # 扫描的文件全集
+        self._name_index = {}          # 文件名 → [路径, ...]，供严格匹配 O(1) 查找
+        self._path_to_iid = {}         # 路径 → “全部文件”树的行 id，执行后就地更新用
+        self._moved = {}               # 本批次中 src → dst（源文件已不存在）
         self.filtered_files = []       # 筛选后的集合
         self.preview_pairs = []        # [(src, dst), ...]
 
@@ -133,6 +338,7 @@ class RenameApp(tk.Tk):
         self.convert_mode_enabled = tk.BooleanVar(value=True)  # True=真正格式转换；False=仅改后缀
         self.delete_source_after_convert = tk.BooleanVar(value=False)
         self.skip_if_same_dtype_ext = tk.BooleanVar(value=False)
+        self.compress_other = tk.BooleanVar(value=False)  # .mha/.nrrd 是否启用 zlib 压缩
 
         self.add_pos = tk.StringVar(value="0")
         self.add_token = tk.StringVar(value="")
@@ -140,6 +346,27 @@ class RenameApp(tk.Tk):
         self.del_len = tk.StringVar(value="1")
         self.new_ext_text = tk.StringVar(value=".nii.gz")
 
+        # 扩展名设置只在输入变化时重新解析，扫描/预览直接使用缓存
+        self._match_exts = tuple(norm_ext_list(self.ext_text.get()))
+        self._new_ext = norm_new_ext(self.new_ext_text.get())
+        self.ext_text.trace_add("write", self._on_ext_text_changed)
+        self.new_ext_text.trace_add("write", self._on_new_ext_changed)
+
+        # 后台转换状态
+        self._conv_pool = None
+        self._conv_futures = []
+        self._conv_counts = [0, 0, 0]  # [成功, 跳过, 失败]
+        self._conv_delete_src = False
+
+        # 日志缓冲：累积后每 200ms 一次性写入 Text；缓冲与 Text 均限制行数
+        self._log_buf = deque(maxlen=LOG_MAX_LINES)
+        self._log_timer = None
+
+        # 后台扫描状态：子线程分批入队，主线程定时插入 Treeview
+        self._scan_thread = None
+        self._scan_queue = queue.Queue()
+        self._scan_found = []
+
         # 外层滚动容器
         shell = ScrollableFrame(self)
         shell.pack(fill="both", expand=True)
@@ -156,7 +383,8 @@ class RenameApp(tk.Tk):
         ttk.Label(top, text="根目录：").pack(side="left")
         ttk.Entry(top, textvariable=self.root_dir, width=62).pack(side="left", padx=4)
         ttk.Button(top, text="选择...", command=self.choose_root).pack(side="left", padx=4)
-        ttk.Button(top, text="扫描影像文件", command=self.scan_files).pack(side="left", padx=4)
+        self.scan_btn = ttk.Button(top, text="扫描影像文件", command=self.scan_files)
+        self.scan_btn.pack(side="left", padx=4)
 
         # 扩展名设置
         extf = ttk.Frame(parent); extf.pack(fill="x", **pad)
@@ -228,6 +456,8 @@ class RenameApp(tk.Tk):
                         variable=self.convert_mode_enabled).pack(side="left", padx=8)
         ttk.Checkbutton(extset, text="转换后删除源文件", variable=self.delete_source_after_convert).pack(side="left", padx=12)
         ttk.Checkbutton(extset, text="同类型同后缀时跳过", variable=self.skip_if_same_dtype_ext).pack(side="left", padx=8)
+        ttk.Checkbutton(extset, text="压缩写出 .mha/.nrrd（.nii.gz 始终压缩）",
+                        variable=self.compress_other).pack(side="left", padx=8)
 
         # 操作
         actf = ttk.Frame(parent); actf.pack(fill="x", **pad)
@@ -261,15 +491,61 @@ class RenameApp(tk.Tk):
         if not root:
             messagebox.showwarning("提示", "请先选择根目录")
             return
-        exts = norm_ext_list(self.ext_text.get())
-        matched = []
-        for dirpath, _dirs, files in os.walk(root):
-            for f in files:
-                full = os.path.join(dirpath, f)
-                if has_allowed_ext(full, exts):
-                    matched.append(os.path.normpath(full))
-        self.all_files = sorted(matched)
-        self._refresh_tree(self.tree_all, [(p,) for p in self.all_files])
+        if self._scan_thread is not None:
+            return
+        # str.endswith 接受元组，一次 C 层调用即可比较全部后缀
+        ext_tuple = self._match_exts
+        self.all_files = []
+        self._name_index = {}
+        self._path_to_iid = {}
+        self._scan_found = []
+        self._refresh_tree(self.tree_all, [])
+        self.scan_btn.config(state="disabled")
+        self._log(f"[SCAN] 开始扫描：{root}")
+        self._scan_thread = threading.Thread(target=self._scan_worker, args=(root, ext_tuple), daemon=True)
+        self._scan_thread.start()
+        self.after(50, self._drain_scan)
+
+    def _scan_worker(self, root, ext_tuple):
+        chunk = []
+        try:
+            for p in iter_files(root, ext_tuple):
+                chunk.append(p)
+                if len(chunk) >= 256:
+                    self._scan_queue.put(chunk)
+                    chunk = []
+            if chunk:
+                self._scan_queue.put(chunk)
+        finally:
+            self._scan_queue.put(None)  # 结束哨兵
+
+    def _drain_scan(self):
+        done = False
+        rows = 0
+        try:
+            while rows < 500:
+                chunk = self._scan_queue.get_nowait()
+                if chunk is None:
+                    done = True
+                    break
+                for p in chunk:
+                    self._path_to_iid[p] = self.tree_all.insert("", "end", values=(p,))
+                self._scan_found.extend(chunk)
+                rows += len(chunk)
+        except queue.Empty:
+            pass
+        if not done:
+            self.after(50, self._drain_scan)
+            return
+
+        self.all_files = sorted(self._scan_found)
+        self._scan_found = []
+        index = {}
+        for p in self.all_files:
+            index.setdefault(os.path.basename(p), []).append(p)
+        self._name_index = index
+        self._scan_thread = None
+        self.scan_btn.config(state="normal")
         self._log(f"[SCAN] 共发现 {len(self.all_files)} 个匹配扩展的文件。")
 
     def add_filter_entry(self):
@@ -295,18 +571,21 @@ class RenameApp(tk.Tk):
         if not keys:
             # 没有关键字就等于不过滤
             self.filtered_files = list(self.all_files)
+        elif self.strict_exact.get():
+            # 当且仅当：文件名必须“恰好等于其中一个关键字”
+            res = []
+            for k in set(keys):
+                res.extend(self._name_index.get(k, ()))
+            self.filtered_files = sorted(res)
         else:
+            # 一般包含：全部关键字都在文件全路径里出现
+            # 关键字只小写一次，每条路径也只小写一次
+            lkeys = [k.lower() for k in keys]
             res = []
             for p in self.all_files:
-                name = os.path.basename(p)
-                if self.strict_exact.get():
-                    # 当且仅当：文件名必须“恰好等于其中一个关键字”
-                    if name in keys:
-                        res.append(p)
-                else:
-                    # 一般包含：全部关键字都在文件全路径里出现
-                    if all(k.lower() in p.lower() for k in keys):
-                        res.append(p)
+                pl = p.lower()
+                if all(k in pl for k in lkeys):
+                    res.append(p)
             self.filtered_files = res
         self._refresh_tree(self.tree_filtered, [(p,) for p in self.filtered_files])
         self._log(f"[FILTER] 关键字={keys} 严格={self.strict_exact.get()} → 命中 {len(self.filtered_files)} 个。")
@@ -339,7 +618,7 @@ class RenameApp(tk.Tk):
         repl_en = self.repl_enabled.get()
         chg_ext = self.change_ext_enabled.get()
         convmode = self.convert_mode_enabled.get()
-        newext = self.new_ext_text.get().strip()
+        newext = self._new_ext
 
         try:
             add_pos = int(self.add_pos.get().strip() or "0")
@@ -358,36 +637,17 @@ class RenameApp(tk.Tk):
 
         repl_pairs = [(ov.get(), nv.get()) for ov, nv, _ in self.replace_rows if ov.get()]
 
+        # 规则只编译一次，循环内每个文件只做一次函数调用
+        replace_fn = compile_replace_rules(repl_pairs) if repl_en else None
+        delete = (del_start, del_len) if (del_en and del_len > 0) else None
+        insert = (add_pos, add_token) if (add_en and add_token) else None
+
         pairs = []
         for src in files:
             d, base, ext = split_compound_ext(src)
-            name = base  # 初始为纯文件名（不含扩展）
-            # 替换
-            if repl_en and repl_pairs:
-                for old, new in repl_pairs:
-                    name = name.replace(old, new)
-            # 删除
-            if del_en and del_len > 0:
-                try:
-                    name = name[:del_start] + name[del_start+del_len:]
-                except Exception:
-                    pass
-            # 增加
-            if add_en and add_token:
-                try:
-                    if add_pos < 0:
-                        idx = len(name) + add_pos
-                    else:
-                        idx = add_pos
-                    idx = max(0, min(len(name), idx))
-                    name = name[:idx] + add_token + name[idx:]
-                except Exception:
-                    pass
+            name = apply_rename_rules(base, replace_fn, delete, insert)
             # 扩展名
-            out_ext = ext
-            if chg_ext and newext:
-                ne = newext if newext.startswith(".") else ("." + newext)
-                out_ext = ne
+            out_ext = newext if (chg_ext and newext) else ext
 
             dst = os.path.join(d, name + out_ext)
             pairs.append((src, os.path.normpath(dst)))
@@ -395,17 +655,28 @@ class RenameApp(tk.Tk):
         self.preview_pairs = pairs
         self._refresh_tree(self.tree_prev, pairs)
         self._log(f"[PREVIEW] 生成 {len(pairs)} 条 Original → New。模式={'转换' if convmode else '仅改后缀'}；新扩展={newext if chg_ext else '(不变)'}")
+        conflicts = detect_conflicts(pairs)
+        if conflicts:
+            self._log(f"[WARN] {len(conflicts)} 个目标文件已存在，执行时将被覆盖，例如：")
+            for _src, dst in conflicts[:5]:
+                self._log(f"      {dst}")
 
     def execute_apply(self):
         if not self.preview_pairs:
             self._log("[APPLY] 先生成转换预览。")
             return
+        if self._conv_pool is not None:
+            self._log("[APPLY] 上一批转换仍在进行中，请稍候。")
+            return
 
         convmode = self.convert_mode_enabled.get()
         delete_src = self.delete_source_after_convert.get()
         skip_same = self.skip_if_same_dtype_ext.get()
+        compress_other = self.compress_other.get()
 
         cnt_ok, cnt_skip, cnt_err = 0, 0, 0
+        self._moved = {}
+        jobs = []  # 需要真正格式转换的 (src, dst)，交给进程池
         for src, dst in self.preview_pairs:
             try:
                 if os.path.normpath(src) == os.path.normpath(dst):
@@ -428,17 +699,7 @@ class RenameApp(tk.Tk):
                             self._log(f"[SKIP] 同扩展跳过（{e1}）：{src}")
                             cnt_skip += 1
                             continue
-                    # 读写
-                    img = _sitk.ReadImage(src)
-                    _sitk.WriteImage(img, dst)
-                    self._log(f"[OK] 转换写出：{dst}")
-                    cnt_ok += 1
-                    if delete_src:
-                        try:
-                            os.remove(src)
-                            self._log(f"      已删除源文件：{src}")
-                        except Exception as e:
-                            self._log(f"      [WARN] 删除源失败：{e}")
+                    jobs.append((src, dst))
                 else:
                     # 仅改后缀/重命名
                     if skip_same:
@@ -448,25 +709,130 @@ class RenameApp(tk.Tk):
                             self._log(f"[SKIP] 名称未变化：{src}")
                             cnt_skip += 1
                             continue
-                    os.replace(src, dst)
+                    move_file(src, dst)
                     self._log(f"[OK] 重命名：{src} → {dst}")
+                    self._sync_processed(src, dst, src_gone=True)
                     cnt_ok += 1
                 self.update_idletasks()
             except Exception as e:
                 self._log(f"[ERR] {src} -> {dst} : {e}")
                 cnt_err += 1
 
+        self._conv_counts = [cnt_ok, cnt_skip, cnt_err]
+        self._conv_delete_src = delete_src
+        if not jobs:
+            self._finish_apply()
+            return
+
+        # 读写解码/压缩为 CPU 密集，按文件分发到进程池；主线程定时收集结果
+        n_cpu = os.cpu_count() or 1
+        # 文件少于核数时，把剩余核分给 pigz 压缩线程；文件多时每个进程各用 1 线程
+        pigz_threads = max(1, n_cpu // min(len(jobs), n_cpu))
+        self._log(f"[APPLY] {len(jobs)} 个文件提交后台转换（进程数={n_cpu}"
+                  f"{'，pigz 线程=' + str(pigz_threads) if _PIGZ else ''}）...")
+        self._conv_pool = ProcessPoolExecutor(max_workers=n_cpu)
+        self._conv_futures = [
+            (src, dst, self._conv_pool.submit(_convert_worker, src, dst, delete_src,
+                                                pigz_threads, compress_other))
+            for src, dst in jobs
+        ]
+        self.after(100, self._poll_convert)
+
+    def _poll_convert(self):
+        pending = []
+        for src, dst, fut in self._conv_futures:
+            if not fut.done():
+                pending.append((src, dst, fut))
+                continue
+            try:
+                mode, del_err = fut.result()
+                if mode == "move":
+                    self._log(f"[FAST-PATH] 同格式直接移动（未重新编码）：{src} → {dst}")
+                elif mode == "copy":
+                    self._log(f"[FAST-PATH] 同格式直接复制（未重新编码）：{dst}")
+                else:
+                    self._log(f"[OK] 转换写出：{dst}")
+                self._conv_counts[0] += 1
+                if self._conv_delete_src and mode != "move":
+                    if del_err is None:
+                        self._log(f"      已删除源文件：{src}")
+                    else:
+                        self._log(f"      [WARN] 删除源失败：{del_err}")
+                src_gone = mode == "move" or (self._conv_delete_src and del_err is None)
+                self._sync_processed(src, dst, src_gone)
+            except Exception as e:
+                self._log(f"[ERR] {src} -> {dst} : {e}")
+                self._conv_counts[2] += 1
+        self._conv_futures = pending
+        if pending:
+            self.after(100, self._poll_convert)
+            return
+
+        self._conv_pool.shutdown(wait=False)
+        self._conv_pool = None
+        self._finish_apply()
+
+    def _sync_processed(self, src, dst, src_gone):
+        """单个文件处理成功后，就地更新“全部文件”树与索引，无需整树重扫"""
+        iid = self._path_to_iid.pop(src, None) if src_gone else None
+        if src_gone:
+            self._moved[src] = dst
+            same_name = self._name_index.get(os.path.basename(src))
+            if same_name and src in same_name:
+                same_name.remove(src)
+        if dst.lower().endswith(self._match_exts) and dst not in self._path_to_iid:
+            if iid is not None:
+                self.tree_all.item(iid, values=(dst,))
+            else:
+                iid = self.tree_all.insert("", "end", values=(dst,))
+            self._path_to_iid[dst] = iid
+            self._name_index.setdefault(os.path.basename(dst), []).append(dst)
+        elif iid is not None:
+            self.tree_all.delete(iid)
+
+    def _finish_apply(self):
+        cnt_ok, cnt_skip, cnt_err = self._conv_counts
         self._log(f"[DONE] 成功={cnt_ok} 跳过={cnt_skip} 失败={cnt_err}")
+        # 列表按本批次结果更新（仅内存操作）；旧预览已失效，需重新生成
+        self.all_files = sorted(self._path_to_iid)
+        if self.filtered_files:
+            self.filtered_files = [self._moved.get(p, p) for p in self.filtered_files
+                                   if self._moved.get(p, p) in self._path_to_iid]
+            self._refresh_tree(self.tree_filtered, [(p,) for p in self.filtered_files])
+        self.preview_pairs = []
+        self._refresh_tree(self.tree_prev, [])
 
     # ------------------ 小工具 ------------------
+    def _on_ext_text_changed(self, *_):
+        self._match_exts = tuple(norm_ext_list(self.ext_text.get()))
+
+    def _on_new_ext_changed(self, *_):
+        self._new_ext = norm_new_ext(self.new_ext_text.get())
+
     def _refresh_tree(self, tree: ttk.Treeview, rows):
-        for i in tree.get_children():
-            tree.delete(i)
+        # 一次 delete 清空全部行（而非逐行 Tcl 调用）；插入期间不让出事件循环，重绘只发生一次
+        children = tree.get_children()
+        if children:
+            tree.delete(*children)
+        insert = tree.insert
         for row in rows:
-            tree.insert("", "end", values=row)
+            insert("", "end", values=row)
 
     def _log(self, msg: str):
-        self.log.insert("end", msg + "\n")
+        self._log_buf.append(msg)
+        if self._log_timer is None:
+            self._log_timer = self.after(200, self._flush_log)
+
+    def _flush_log(self):
+        self._log_timer = None
+        if not self._log_buf:
+            return
+        self.log.insert("end", "\n".join(self._log_buf) + "\n")
+        self._log_buf.clear()
+        # 超出上限时从头部截断，避免长批次后 Text 越来越慢
+        lines = int(self.log.index("end-1c").split(".")[0])
+        if lines > LOG_MAX_LINES:
+            self.log.delete("1.0", f"{lines - LOG_MAX_LINES}.0")
         self.log.see("end")
 
 